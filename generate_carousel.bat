@@ -7,15 +7,16 @@ if "%1"=="" (
     echo.
     echo 💡 Usage: generate_carousel.bat "your-file.md"
     echo 📝 Example: generate_carousel.bat "Marketing Report.md"
+    echo 📦 Batch: generate_carousel.bat reports --out-dir carousels
     echo.
     pause
     exit /b 1
 )
 
-echo 📄 Processing: %1
+echo 📄 Processing: %*
 echo.
 
-python generate_carousel.py %1
+python generate_carousel.py %*
 
 echo.
 echo ✨ Done! Check the generated files.
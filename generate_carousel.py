@@ -1,33 +1,79 @@
 import re
 import os
 import sys
+import argparse
+import asyncio
+import atexit
+import base64
+import collections
+import concurrent.futures
+import contextlib
+import datetime
+import functools
+import glob
+import hashlib
+import http.server
+import io
+import shutil
+import itertools
+import math
+import mmap
+import threading
+import time
+import uuid
 import requests
 import markdown
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, Comment, NavigableString
 # from weasyprint import HTML
 from playwright.sync_api import sync_playwright
 import openai
 import json
+import queue
+import random
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
 # --- CONFIGURACIÓN ---
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Convert markdown reports into LinkedIn carousels (HTML + PDF).",
+        epilog="Several files, a directory or a glob pattern (or --out-dir) switch to batch mode."
+    )
+    parser.add_argument("inputs", nargs="*", help="Markdown files, directories or glob patterns")
+    parser.add_argument("--out-dir", help="Batch mode: directory for the generated files (default: current directory)")
+    parser.add_argument("--concurrency", type=int, default=None, help="Batch mode: markdown files sent to the AI at once")
+    parser.add_argument("--render-concurrency", type=int, default=None, help="Batch mode: PDFs rendered at once")
+    parser.add_argument("--summary", help="Batch mode: where to write the JSON summary")
+    parser.add_argument("--full", action="store_true", help="Regenerate every slide even if only some sections changed since the last run")
+    parser.add_argument("--offline", action="store_true", help="Build slides with the local engine, without any AI call")
+    parser.add_argument("--llm-backend", choices=["openai", "standin", "record", "replay"], help="Where AI answers come from (default: CAROUSEL_LLM_BACKEND or openai)")
+    args = parser.parse_args(argv)
+
     # Get input file from command line argument - REQUIRED
-    if len(sys.argv) > 1:
-        INPUT_MD = sys.argv[1]
-        print(f"📄 Processing: {INPUT_MD}")
-    else:
+    if not args.inputs:
         print("❌ Error: No markdown file specified!")
         print("💡 Usage: python generate_carousel.py [markdown_file.md]")
         print("📝 Example: python generate_carousel.py 'Marketing Report.md'")
+        print("📦 Batch: python generate_carousel.py reports/ 'drafts/*.md' --out-dir carousels")
         print("📋 Available batch scripts:")
         print("   Windows: generate_carousel.bat 'Your File.md'")
         print("   macOS/Linux: ./generate_carousel.sh 'Your File.md'")
         sys.exit(1)
 
+    args.batch = (
+        args.out_dir is not None
+        or len(args.inputs) > 1
+        or os.path.isdir(args.inputs[0])
+        or any(ch in args.inputs[0] for ch in "*?[")
+    )
+    if args.batch:
+        return args
+
+    INPUT_MD = args.inputs[0]
+    print(f"📄 Processing: {INPUT_MD}")
+
     # Generate output filenames based on input
     base_name = os.path.splitext(os.path.basename(INPUT_MD))[0]
     OUTPUT_HTML = f"{base_name}_carousel.html"
@@ -35,11 +81,14 @@ def main():
 
     print(f"📁 Output files: {OUTPUT_HTML}, {OUTPUT_PDF}")
 
-    return INPUT_MD, OUTPUT_HTML, OUTPUT_PDF
+    args.input_md, args.output_html, args.output_pdf = INPUT_MD, OUTPUT_HTML, OUTPUT_PDF
+    return args
 
 # Only run main when script is executed directly
 if __name__ == "__main__":
-    INPUT_MD, OUTPUT_HTML, OUTPUT_PDF = main()
+    CLI_ARGS = main()
+    if not CLI_ARGS.batch:
+        INPUT_MD, OUTPUT_HTML, OUTPUT_PDF = CLI_ARGS.input_md, CLI_ARGS.output_html, CLI_ARGS.output_pdf
 
 ICON_DIR = "icons"
 ICON_FALLBACK = "file-text"
@@ -87,160 +136,1948 @@ def read_markdown_file(input_md):
         sys.exit(1)
 
     try:
-        with open(input_md, "r", encoding="utf-8") as f:
-            md_text = f.read()
+        md_text = load_markdown(input_md)
         print(f"✅ Successfully loaded {len(md_text)} characters from {input_md}")
+        if is_large_markdown(md_text):
+            print(f"📚 Large input ({os.path.getsize(input_md) / 1048576:.1f} MB): the slides will be written from its outline")
         return md_text
     except Exception as e:
         print(f"❌ Error reading file: {e}")
         sys.exit(1)
 
-# --- AI-powered content analysis and slide generation ---
-def generate_slides_with_ai(md_text):
-    """Use OpenAI to intelligently parse markdown and create structured slides"""
+# --- Large markdown inputs ---
+# MarkdownIndex memory-maps a file (or wraps an in-memory buffer) and finds all
+# headings in one regex pass over the bytes. Sections are only decoded when they
+# are asked for, so very large exports can be previewed and digested section
+# by section without holding the whole document as one string.
+LARGE_MARKDOWN_BYTES = int(os.getenv('CAROUSEL_LARGE_MARKDOWN_MB', '2')) * 1024 * 1024
+HEADING_BYTES_RE = re.compile(rb"^(?:\xef\xbb\xbf)?(#{1,6})[ \t]+([^\r\n]*?)[ \t#]*\r?$|^[ \t]*(```|~~~)", re.MULTILINE)
+
+class MarkdownIndex:
+    """Byte-offset heading index over a markdown file or buffer, with lazily decoded sections"""
+
+    def __init__(self, source):
+        self._file = None
+        self._mmap = None
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            self._buffer = source
+        else:
+            self._file = open(source, "rb")
+            try:
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+                self._buffer = self._mmap
+            except ValueError:
+                self._buffer = b""  # Empty files cannot be mapped
+        self.size = len(self._buffer)
+        self._start = 3 if self._buffer[:3] == b"\xef\xbb\xbf" else 0  # Skip a UTF-8 BOM
+        self.headings = self._scan()
+        self.spans = self._spans()
+
+    def _scan(self):
+        """(offset, level, heading) of every heading outside fenced code blocks"""
+        headings = []
+        in_fence = False
+        for match in HEADING_BYTES_RE.finditer(self._buffer):
+            if match.group(3):
+                in_fence = not in_fence
+            elif not in_fence:
+                headings.append((match.start(1), len(match.group(1)), match.group(2).decode("utf-8", "replace").strip()))
+        return headings
+
+    def _spans(self):
+        """(start, end, heading, level) byte spans of the sections, like split_markdown_sections"""
+        spans = []
+        if not self.headings or self.headings[0][0] > self._start:
+            end = self.headings[0][0] if self.headings else self.size
+            spans.append((self._start, end, None, 0))
+        for i, (offset, level, heading) in enumerate(self.headings):
+            end = self.headings[i + 1][0] if i + 1 < len(self.headings) else self.size
+            spans.append((offset, end, heading, level))
+        return spans
+
+    def __len__(self):
+        return len(self.spans)
+
+    def text(self, start=None, end=None):
+        start = self._start if start is None else start
+        return bytes(self._buffer[start:self.size if end is None else end]).decode("utf-8", "replace")
+
+    def section(self, i):
+        start, end, heading, level = self.spans[i]
+        return {"heading": heading, "level": level, "text": self.text(start, end)}
+
+    def iter_sections(self):
+        """Sections one at a time; only the current section is held in memory"""
+        for start, end, heading, level in self.spans:
+            text = self.text(start, end)
+            if text.strip():
+                yield {"heading": heading, "level": level, "text": text}
+
+    def preview(self, max_chars=1000):
+        """The first max_chars characters, decoding only the bytes needed"""
+        text = bytes(self._buffer[self._start:self._start + max_chars * 4]).decode("utf-8", "ignore")
+        return text[:max_chars]
+
+    def read(self):
+        """The whole document as one string"""
+        return self.text()
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._buffer = b""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def load_markdown(path):
+    """Full text of a markdown file, large ones included: caches and manifests key on the real content"""
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+def is_large_markdown(md_text):
+    """Whether md_text is over LARGE_MARKDOWN_BYTES; its slides are then always written from its outline"""
+    return len(md_text) * 4 > LARGE_MARKDOWN_BYTES and len(md_text.encode("utf-8")) > LARGE_MARKDOWN_BYTES
+
+# --- LLM response cache ---
+# Validated slide JSON is cached on disk, keyed by the normalized markdown, the
+# model, the prompt version, the temperature and the pre-digest and condense
+# settings, so re-uploading a report does not pay for another GPT-4 run. Bump
+# PROMPT_VERSION whenever the prompt changes.
+LLM_MODEL = "gpt-4o"  # Structured outputs need gpt-4o or newer
+LLM_TEMPERATURE = 0.7
+PROMPT_VERSION = 3
+LLM_CACHE_ENABLED = os.getenv('CAROUSEL_LLM_CACHE', '1') != '0'
+LLM_CACHE_DIR = os.getenv('CAROUSEL_LLM_CACHE_DIR', os.path.join("temp", "llm_cache"))
+LLM_CACHE_MB = int(os.getenv('CAROUSEL_LLM_CACHE_MB', '32'))
+LLM_CACHE_TTL = int(os.getenv('CAROUSEL_LLM_CACHE_TTL', str(30 * 24 * 3600)))
+
+_llm_cache = None
+
+def normalize_markdown(md_text):
+    """Canonical form of markdown for hashing: unified newlines, no trailing spaces or extra blank lines"""
+    lines = [line.rstrip() for line in md_text.replace("\r\n", "\n").replace("\r", "\n").split("\n")]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+def llm_cache_key(md_text, model=LLM_MODEL, temperature=LLM_TEMPERATURE, prompt_version=PROMPT_VERSION):
+    payload = json.dumps({
+        "markdown": normalize_markdown(md_text),
+        "model": model,
+        "temperature": temperature,
+        "prompt_version": prompt_version,
+        # How the document was reduced before the prompt changes what the model saw
+        "predigest": OUTLINE_MIN_SAVINGS if PREDIGEST_ENABLED else None,
+        "condense": [CONDENSE_MODEL, DIRECT_CONTENT_CHARS, CONDENSE_MAX_ROUNDS],
+        # Stand-in and replayed answers must never be served to real runs
+        **({"backend": LLM_BACKEND} if LLM_BACKEND != "openai" else {}),
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def get_llm_cache():
+    """Process-wide on-disk cache of generated slides"""
+    global _llm_cache
+    with _render_lock:
+        if _llm_cache is None:
+            _llm_cache = DiskCache(LLM_CACHE_DIR, LLM_CACHE_MB * 1024 * 1024, LLM_CACHE_TTL, suffix=".json")
+    return _llm_cache
+
+def _cached_slides(key, record=True):
+    data = get_llm_cache().get(key, record=record)
+    if data is None:
+        return None
+    try:
+        slides = json.loads(data.decode("utf-8"))
+        return [_normalize_slide(slide, i) for i, slide in enumerate(slides)]
+    except (ValueError, TypeError):
+        return None
+
+# --- LLM telemetry ---
+# Every chat-completion call and every slide generation is appended as one JSON
+# line to LLM_TELEMETRY_FILE: tokens, time to first token, latency, model,
+# retries, estimated cost and whether the result fell back to basic parsing.
+# Once the file passes LLM_TELEMETRY_MAX_MB it is rotated to "<file>.1", so the
+# store (and every read of it) stays bounded while recent history is kept.
+LLM_TELEMETRY_FILE = os.getenv('CAROUSEL_LLM_TELEMETRY_FILE', 'llm_telemetry.jsonl')
+LLM_TELEMETRY_MAX_MB = float(os.getenv('CAROUSEL_LLM_TELEMETRY_MAX_MB', '10'))
+# USD per 1K (prompt, completion) tokens, used for cost estimates only
+LLM_PRICES_PER_1K = {
+    "gpt-4": (0.03, 0.06),
+    "gpt-4o": (0.0025, 0.01),
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+}
+
+_telemetry_lock = threading.Lock()
+
+def estimate_llm_cost(model, prompt_tokens, completion_tokens, backend=None):
+    if (backend or LLM_BACKEND) != "openai":
+        return None  # Stand-in, recorded and replayed calls cost nothing
+    prices = LLM_PRICES_PER_1K.get(model)
+    if prices is None or prompt_tokens is None or completion_tokens is None:
+        return None
+    return round(prompt_tokens / 1000 * prices[0] + completion_tokens / 1000 * prices[1], 6)
+
+def _rotate_llm_telemetry():
+    """Move a full telemetry file to "<file>.1", replacing the previous rotation"""
+    try:
+        if os.path.getsize(LLM_TELEMETRY_FILE) > LLM_TELEMETRY_MAX_MB * 1024 * 1024:
+            os.replace(LLM_TELEMETRY_FILE, LLM_TELEMETRY_FILE + ".1")
+    except OSError:
+        pass
+
+def record_llm_event(event):
+    """Append one telemetry record to the local store (never raises)"""
+    event = {"ts": round(time.time(), 3), "backend": LLM_BACKEND, **event}
+    try:
+        with _telemetry_lock:
+            _rotate_llm_telemetry()
+            with open(LLM_TELEMETRY_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+    except Exception as e:
+        print(f"⚠️  Could not write LLM telemetry: {e}")
+
+class LLMCallRecord:
+    """Context manager that times one chat-completion call and records it on exit"""
+
+    def __init__(self, purpose, model, generation=None, attempt=0):
+        self.generation = generation
+        self.data = {
+            "kind": "call",
+            "purpose": purpose,
+            "model": model,
+            "backend": LLM_BACKEND,
+            "generation_id": generation["generation_id"] if generation else None,
+            "prompt_tokens": None,
+            "completion_tokens": None,
+            "ttft_s": None,
+            "latency_s": None,
+            "attempt": attempt,
+            "status": "ok",
+            "error": None,
+        }
+        self._started = None
+
+    def __enter__(self):
+        self._started = time.monotonic()
+        return self
+
+    def first_token(self):
+        if self.data["ttft_s"] is None:
+            self.data["ttft_s"] = round(time.monotonic() - self._started, 3)
+
+    def usage(self, usage):
+        if usage is not None:
+            self.data["prompt_tokens"] = usage.prompt_tokens
+            self.data["completion_tokens"] = usage.completion_tokens
+
+    def __exit__(self, exc_type, exc, tb):
+        data = self.data
+        data["latency_s"] = round(time.monotonic() - self._started, 3)
+        if exc_type is GeneratorExit:
+            data["status"] = "abandoned"
+        elif exc_type is not None:
+            data["status"] = "error"
+            data["error"] = str(exc) or exc_type.__name__
+        data["cost_usd"] = estimate_llm_cost(data["model"], data["prompt_tokens"], data["completion_tokens"], data["backend"])
+        if self.generation is not None:
+            with _telemetry_lock:
+                for key in ("prompt_tokens", "completion_tokens", "cost_usd"):
+                    if data[key] is not None:
+                        self.generation[key] = round(self.generation.get(key, 0) + data[key], 6)
+                self.generation["retries"] = self.generation.get("retries", 0) + (1 if data["attempt"] else 0)
+        record_llm_event(data)
+        return False
+
+def load_llm_telemetry(kind=None, since=None):
+    """Read telemetry records, optionally only one kind ("call"/"generation") newer than `since` (epoch seconds)"""
+    records = []
+    for path in (LLM_TELEMETRY_FILE + ".1", LLM_TELEMETRY_FILE):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if kind is not None and record.get("kind") != kind:
+                        continue
+                    if since is not None and record.get("ts", 0) < since:
+                        continue
+                    records.append(record)
+        except OSError:
+            continue
+    return records
+
+def _percentile(values, pct):
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, int(round(pct / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+def summarize_llm_telemetry(since=None):
+    """p50/p95 latencies, token usage, cost, retries and fallback rate of recorded generations.
+
+    Only records served by the real OpenAI backend count; stand-in, record and
+    replay runs are benchmarks and would skew latency and cost.
+    """
+    records = [r for r in load_llm_telemetry(since=since) if r.get("backend", "openai") == "openai"]
+    generations = [r for r in records if r.get("kind") == "generation"]
+    calls = [r for r in records if r.get("kind") == "call"]
+    slide_calls = [c for c in calls if c.get("purpose") == "slides"]
+    latencies = [g.get("latency_s") for g in generations if not g.get("cache_hit") and not g.get("offline")]
+    return {
+        "generations": len(generations),
+        "calls": len(calls),
+        "failed_calls": sum(1 for c in calls if c.get("status") == "error"),
+        "cache_hits": sum(1 for g in generations if g.get("cache_hit")),
+        "fallbacks": sum(1 for g in generations if g.get("fell_back")),
+        "retries": sum(1 for c in calls if c.get("attempt")),
+        "p50_generation_s": _percentile(latencies, 50),
+        "p95_generation_s": _percentile(latencies, 95),
+        "p50_ttft_s": _percentile([c.get("ttft_s") for c in slide_calls], 50),
+        "p95_ttft_s": _percentile([c.get("ttft_s") for c in slide_calls], 95),
+        "prompt_tokens": sum(c.get("prompt_tokens") or 0 for c in calls),
+        "completion_tokens": sum(c.get("completion_tokens") or 0 for c in calls),
+        "cost_usd": round(sum(c.get("cost_usd") or 0 for c in calls), 4),
+        "predigest_tokens_saved": sum(
+            g["content_tokens_raw"] - g["content_tokens_sent"] for g in generations if "content_tokens_raw" in g
+        ),
+    }
+
+# --- LLM call policy ---
+# OpenAI calls are retried with jittered exponential backoff inside one latency
+# budget per generation. The slide call walks down a model ladder: once most of
+# the budget is spent, or a model timed out, the next attempt uses the next
+# (faster) model. Every attempt is recorded as its own telemetry call.
+LLM_MAX_ATTEMPTS = int(os.getenv('CAROUSEL_LLM_MAX_ATTEMPTS', '4'))
+LLM_LATENCY_BUDGET = float(os.getenv('CAROUSEL_LLM_BUDGET_S', '120'))
+LLM_MODEL_LADDER = [m.strip() for m in os.getenv('CAROUSEL_LLM_MODEL_LADDER', f'{LLM_MODEL},gpt-4o-mini').split(',') if m.strip()]
+LLM_FAILOVER_AT = 0.5  # Share of the budget after which the ladder steps down
+LLM_BACKOFF_BASE = 1.0
+LLM_BACKOFF_MAX = 16.0
+LLM_MIN_ATTEMPT_S = 5.0  # No attempt is started with less budget left than this
+
+openai.max_retries = 0  # Retries are handled by LLMCallPolicy, not by the SDK
+
+RETRYABLE_LLM_ERRORS = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+class LLMDeadlineExceeded(TimeoutError):
+    pass
+
+def _retry_after_seconds(error):
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+class LLMCallPolicy:
+    """Retry, deadline and model-ladder policy shared by all calls of one generation"""
+
+    def __init__(self, budget_s=LLM_LATENCY_BUDGET, models=None, max_attempts=LLM_MAX_ATTEMPTS):
+        self.budget_s = budget_s
+        self.models = list(models or LLM_MODEL_LADDER) or [LLM_MODEL]
+        self.max_attempts = max_attempts
+        self.deadline = time.monotonic() + budget_s
+        self.last_model = None
+        self._rung = 0
+        self._lock = threading.Lock()  # Condense calls share the policy across worker threads
+
+    def remaining(self):
+        return self.deadline - time.monotonic()
+
+    def check_deadline(self):
+        if self.remaining() <= 0:
+            raise LLMDeadlineExceeded(f"latency budget of {self.budget_s:.0f}s used up")
+
+    def request_timeout(self):
+        return max(1.0, self.remaining())
+
+    def model(self):
+        """Model for the next attempt, stepping down the ladder once the budget runs low"""
+        with self._lock:
+            if self.remaining() < self.budget_s * (1 - LLM_FAILOVER_AT):
+                self._rung = min(self._rung + 1, len(self.models) - 1)
+            return self.models[self._rung]
+
+    def _step_down(self):
+        with self._lock:
+            self._rung = min(self._rung + 1, len(self.models) - 1)
+
+    def retry_delay(self, error, attempt):
+        """Seconds to wait before retrying after error, or None if it should not be retried"""
+        if attempt + 1 >= self.max_attempts or not isinstance(error, RETRYABLE_LLM_ERRORS):
+            return None
+        if isinstance(error, openai.APITimeoutError):
+            self._step_down()  # A model that timed out once will not be faster the next time
+        delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+        retry_after = _retry_after_seconds(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if self.remaining() - delay < LLM_MIN_ATTEMPT_S:
+            return None
+        return delay
+
+    def wait_before_retry(self, purpose, model, attempt, error):
+        """Report a failed attempt and back off; returns False when the error is final"""
+        delay = self.retry_delay(error, attempt)
+        if delay is None:
+            return False
+        print(f"⚠️  {purpose} attempt {attempt + 1} with {model} failed ({type(error).__name__}), retrying in {delay:.1f}s")
+        time.sleep(delay)
+        return True
+
+    def call(self, purpose, request, generation=None, model=None):
+        """Run request(model, timeout) under the policy and return its response"""
+        attempt = 0
+        while True:
+            self.check_deadline()
+            attempt_model = self.last_model = model or self.model()
+            try:
+                with LLMCallRecord(purpose, attempt_model, generation, attempt) as call:
+                    response = request(attempt_model, self.request_timeout())
+                    call.usage(getattr(response, "usage", None))
+                return response
+            except Exception as e:
+                if not self.wait_before_retry(purpose, attempt_model, attempt, e):
+                    raise
+                attempt += 1
+
+# --- LLM backends ---
+# CAROUSEL_LLM_BACKEND picks where chat completions come from:
+#   openai   - the OpenAI API (default)
+#   standin  - a local server speaking the chat-completions protocol that writes
+#              deterministic answers from the request itself, with configurable
+#              latency and token rate; no network or API key needed
+#   record   - like openai, but every response is saved to LLM_RECORDINGS_DIR
+#   replay   - serves recorded responses back byte for byte, offline
+# All modes except openai go through one local HTTP server, so streaming and
+# the SDK's own parsing behave exactly as they do against the real API.
+LLM_BACKENDS = ("openai", "standin", "record", "replay")
+LLM_BACKEND = os.getenv('CAROUSEL_LLM_BACKEND', 'openai')
+LLM_UPSTREAM_URL = os.getenv('CAROUSEL_LLM_UPSTREAM_URL', 'https://api.openai.com/v1')
+LLM_RECORDINGS_DIR = os.getenv('CAROUSEL_LLM_RECORDINGS_DIR', os.path.join("temp", "llm_recordings"))
+LLM_STANDIN_LATENCY_S = float(os.getenv('CAROUSEL_LLM_STANDIN_LATENCY_S', '0.5'))  # Time to first token
+LLM_STANDIN_TOKENS_PER_S = float(os.getenv('CAROUSEL_LLM_STANDIN_TOKENS_PER_S', '200'))
+STANDIN_ARRAY_ITEMS = 4
+# Labels after which each prompt carries the document itself (slides, regenerate, condense)
+STANDIN_SOURCE_MARKERS = ("Content to analyze:", "Relevant source content:", "Report part:")
+
+_llm_clients = {}
+_llm_server = None
+_llm_backend_lock = threading.Lock()
+_llm_server_lock = threading.Lock()
+
+def llm_available():
+    """Whether slide generation can call a model (offline backends need no API key)"""
+    return LLM_BACKEND in ("standin", "replay") or bool(openai.api_key)
+
+def get_llm_client():
+    """Chat-completions client for the configured backend"""
+    if LLM_BACKEND == "openai":
+        return openai  # Module-level client, configured from the environment above
+    if LLM_BACKEND not in LLM_BACKENDS:
+        raise ValueError(f"Unknown LLM backend {LLM_BACKEND!r}, expected one of {', '.join(LLM_BACKENDS)}")
+    with _llm_backend_lock:
+        client = _llm_clients.get(LLM_BACKEND)
+        if client is None:
+            client = openai.OpenAI(
+                api_key=openai.api_key if LLM_BACKEND == "record" else LLM_BACKEND,
+                base_url=get_llm_backend_server().url,
+                max_retries=0
+            )
+            _llm_clients[LLM_BACKEND] = client
+    return client
+
+def get_llm_backend_server():
+    global _llm_server
+    with _llm_server_lock:
+        if _llm_server is None:
+            _llm_server = LLMBackendServer()
+    return _llm_server
+
+def llm_recording_key(path, body):
+    """Recordings are keyed by endpoint and the canonical JSON request body"""
+    try:
+        body = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode("utf-8")
+    except ValueError:
+        pass
+    return hashlib.sha256(path.encode("utf-8") + b"\n" + body).hexdigest()
+
+class LLMBackendServer:
+    """Local chat-completions endpoint serving the standin, record and replay backends"""
+
+    def __init__(self, host="127.0.0.1", port=0):
+        server = self
+        
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                try:
+                    server.handle(self, body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+            
+            def log_message(self, format, *args):
+                pass
+        
+        self.httpd = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_address[1]}/v1"
+        threading.Thread(target=self.httpd.serve_forever, name="carousel-llm-backend", daemon=True).start()
+
+    def handle(self, request, body):
+        path = request.path[len("/v1"):] if request.path.startswith("/v1") else request.path
+        if LLM_BACKEND == "record":
+            return self._record(request, path, body)
+        if LLM_BACKEND == "replay":
+            return self._replay(request, path, body)
+        if path != "/chat/completions":
+            return self._send(request, 404, "application/json", _openai_error(f"No stand-in for {path}", "not_found"))
+        return self._standin(request, json.loads(body or b"{}"))
+
+    def _send(self, request, status, content_type, payload):
+        request.send_response(status)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(payload)))
+        request.end_headers()
+        request.wfile.write(payload)
+
+    # Record / replay
+    def _recording_paths(self, path, body):
+        base = os.path.join(LLM_RECORDINGS_DIR, llm_recording_key(path, body))
+        return base + ".json", base + ".body"
+
+    def _record(self, request, path, body):
+        headers = {"Content-Type": "application/json"}
+        if request.headers.get("Authorization"):
+            headers["Authorization"] = request.headers["Authorization"]
+        started = time.monotonic()
+        upstream = requests.post(LLM_UPSTREAM_URL.rstrip("/") + path, data=body, headers=headers, stream=True, timeout=LLM_LATENCY_BUDGET)
+        content_type = upstream.headers.get("Content-Type", "application/json")
+        request.send_response(upstream.status_code)
+        request.send_header("Content-Type", content_type)
+        request.end_headers()
+        # Relay as it arrives (the response ends when the connection closes) and keep a copy
+        received = []
+        for chunk in upstream.iter_content(chunk_size=None):
+            received.append(chunk)
+            request.wfile.write(chunk)
+            request.wfile.flush()
+        if upstream.status_code != 200:
+            return
+        meta_path, body_path = self._recording_paths(path, body)
+        os.makedirs(LLM_RECORDINGS_DIR, exist_ok=True)
+        with open(body_path, "wb") as f:
+            f.write(b"".join(received))
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "path": path,
+                "status": upstream.status_code,
+                "content_type": content_type,
+                "elapsed_s": round(time.monotonic() - started, 3),
+                "recorded_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            }, f, indent=2)
+
+    def _replay(self, request, path, body):
+        meta_path, body_path = self._recording_paths(path, body)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                payload = f.read()
+        except OSError:
+            return self._send(request, 404, "application/json", _openai_error("No recording for this request", "replay_miss"))
+        self._send(request, meta["status"], meta["content_type"], payload)
+
+    # Stand-in
+    def _standin(self, request, params):
+        content = _standin_content(params)
+        model = params.get("model", LLM_MODEL)
+        request_id = "chatcmpl-standin-" + hashlib.sha256(content.encode("utf-8")).hexdigest()[:24]
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in params.get("messages", [])) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4, "total_tokens": prompt_tokens + len(content) // 4}
+        time.sleep(LLM_STANDIN_LATENCY_S)
+        
+        if not params.get("stream"):
+            response = {
+                "id": request_id, "object": "chat.completion", "created": 0, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+            return self._send(request, 200, "application/json", json.dumps(response).encode("utf-8"))
+        
+        request.send_response(200)
+        request.send_header("Content-Type", "text/event-stream")
+        request.end_headers()
+        
+        def event(choices, **extra):
+            chunk = {"id": request_id, "object": "chat.completion.chunk", "created": 0, "model": model, "choices": choices, **extra}
+            request.wfile.write(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n")
+            request.wfile.flush()
+        
+        # About 4 characters per token, sent in 20 ms ticks
+        chars_per_tick = max(1, int(LLM_STANDIN_TOKENS_PER_S * 4 * 0.02))
+        for i in range(0, len(content), chars_per_tick):
+            event([{"index": 0, "delta": {"content": content[i:i + chars_per_tick]}, "finish_reason": None}])
+            time.sleep(0.02)
+        event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (params.get("stream_options") or {}).get("include_usage"):
+            event([], usage=usage)
+        request.wfile.write(b"data: [DONE]\n\n")
+
+def _openai_error(message, code):
+    return json.dumps({"error": {"message": message, "type": "invalid_request_error", "code": code}}).encode("utf-8")
+
+def _standin_source(messages):
+    """The document part of the last user message, without the prompt around it"""
+    text = next((str(m.get("content", "")) for m in reversed(messages) if m.get("role") == "user"), "")
+    for marker in STANDIN_SOURCE_MARKERS:
+        if marker in text:
+            return text.rsplit(marker, 1)[1]
+    return text
+
+def _standin_content(params):
+    """Deterministic answer: an instance of the requested JSON schema, or the source condensed"""
+    source = _standin_source(params.get("messages", []))
+    lines = [line.strip().lstrip("#*->").strip() for line in source.splitlines()]
+    lines = [line for line in lines if len(line) > 3] or ["Stand-in content"]
+    response_format = params.get("response_format") or {}
+    if response_format.get("type") != "json_schema":
+        return "\n".join(lines)[:max(200, params.get("max_tokens", 1000) * 3)]
     
-    if not openai.api_key:
-        print("⚠️  OpenAI API key not found. Please set OPENAI_API_KEY in .env file.")
-        print("   Falling back to basic parsing...")
-        return create_fallback_slides(md_text)
+    counter = itertools.count()
+    
+    def build(schema, index=0):
+        if "anyOf" in schema:
+            return build(schema["anyOf"][index % len(schema["anyOf"])], index)
+        if "enum" in schema:
+            return schema["enum"][0]
+        kind = schema.get("type")
+        if kind == "object":
+            return {name: build(sub, index) for name, sub in schema.get("properties", {}).items()}
+        if kind == "array":
+            return [build(schema.get("items", {}), i) for i in range(STANDIN_ARRAY_ITEMS)]
+        if kind in ("integer", "number"):
+            return index
+        if kind == "boolean":
+            return True
+        return lines[next(counter) % len(lines)][:200]
+    
+    return json.dumps(build(response_format["json_schema"]["schema"]), ensure_ascii=False)
+
+# --- Long document handling ---
+# Documents that do not fit in one prompt are split on their heading structure,
+# each chunk is condensed concurrently by a fast model (map) and the condensed
+# notes are merged into the single slide-generation prompt (reduce). Nothing past
+# the first page is dropped any more and wall-clock time follows the largest chunk.
+DIRECT_CONTENT_CHARS = 6000  # Documents up to this size go straight into the prompt
+CONDENSE_MODEL = os.getenv('CAROUSEL_CONDENSE_MODEL', 'gpt-4o-mini')
+CONDENSE_CHUNK_CHARS = 8000
+CONDENSE_CONCURRENCY = int(os.getenv('CAROUSEL_CONDENSE_CONCURRENCY', '4'))
+CONDENSE_MIN_CHARS = 400
+CONDENSE_MAX_ROUNDS = 3  # Rounds of condensing the notes again before they are shortened evenly
+
+HEADING_RE = re.compile(r'^(#{1,6})\s+(.+?)\s*#*\s*$')
+
+def split_markdown_sections(md_text):
+    """Split markdown into heading-delimited sections.
+
+    Returns a list of dicts with ``heading`` (None for text before the first
+    heading), ``level`` and ``text`` (the section including its heading line).
+    Headings inside fenced code blocks are ignored.
+    """
+    sections = []
+    current = {"heading": None, "level": 0, "lines": []}
+    in_fence = False
+    for line in md_text.splitlines(keepends=True):
+        stripped = line.strip()
+        if stripped.startswith("```") or stripped.startswith("~~~"):
+            in_fence = not in_fence
+        match = None if in_fence else HEADING_RE.match(stripped)
+        if match and line[:1] == "#":
+            if current["lines"]:
+                sections.append(current)
+            current = {"heading": match.group(2), "level": len(match.group(1)), "lines": []}
+        current["lines"].append(line)
+    if current["lines"]:
+        sections.append(current)
+    return [
+        {"heading": s["heading"], "level": s["level"], "text": "".join(s["lines"])}
+        for s in sections
+        if "".join(s["lines"]).strip()
+    ]
+
+def _chunk_sections(sections, max_chars=CONDENSE_CHUNK_CHARS):
+    """Group consecutive sections into chunks of at most max_chars, splitting oversized sections on paragraphs"""
+    pieces = []
+    for section in sections:
+        text = section["text"]
+        if len(text) <= max_chars:
+            pieces.append(text)
+            continue
+        part = ""
+        for paragraph in re.split(r'(\n\s*\n)', text):
+            if part and len(part) + len(paragraph) > max_chars:
+                pieces.append(part)
+                part = ""
+            while len(paragraph) > max_chars:
+                pieces.append(paragraph[:max_chars])
+                paragraph = paragraph[max_chars:]
+            part += paragraph
+        if part.strip():
+            pieces.append(part)
+    
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) > max_chars:
+            chunks.append(current)
+            current = ""
+        current += piece
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+def _condense_chunk(chunk, target_chars, generation=None, policy=None):
+    """Map step: condense one chunk into dense notes that keep every fact worth a slide"""
+    policy = policy or LLMCallPolicy()
+    response = policy.call(
+        "condense",
+        lambda model, timeout: _create_condense_completion(chunk, target_chars, model, timeout),
+        generation,
+        model=CONDENSE_MODEL
+    )
+    return response.choices[0].message.content.strip()
+
+def _create_condense_completion(chunk, target_chars, model=CONDENSE_MODEL, timeout=None):
+    return get_llm_client().chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": "You condense business documents into dense notes for a presentation writer."},
+            {"role": "user", "content": f"""Condense this part of a longer markdown report into compact markdown notes of at most {target_chars} characters.
+Keep the original headings. Keep every statistic, number, percentage, date, named company or product, case study and recommendation. Drop filler and repetition.
+
+Report part:
+{chunk}"""}
+        ],
+        temperature=0.2,
+        max_tokens=max(256, target_chars // 3),
+        timeout=timeout
+    )
+
+def condense_markdown(md_text, max_chars=DIRECT_CONTENT_CHARS, concurrency=CONDENSE_CONCURRENCY, generation=None, policy=None):
+    """Reduce a long document to at most max_chars of notes; short documents are returned unchanged"""
+    if len(md_text) <= max_chars:
+        return md_text
     
+    notes = None
+    for round_number in range(CONDENSE_MAX_ROUNDS):
+        # Many chunks give notes that together are still too long; they are condensed again
+        source = md_text if notes is None else "\n\n".join(notes)
+        notes = _condense_round(source, max_chars, concurrency, generation, policy, round_number)
+        if sum(len(n) for n in notes) + 2 * (len(notes) - 1) <= max_chars:
+            return "\n\n".join(notes)
+    
+    # Still over budget: shorten every note evenly rather than losing the last sections
+    share = max(1, (max_chars - 2 * (len(notes) - 1)) // len(notes))
+    print(f"⚠️  Notes still too long after {CONDENSE_MAX_ROUNDS} rounds, keeping the first {share} characters of each")
+    return "\n\n".join(note[:share] for note in notes)
+
+def _condense_round(md_text, max_chars, concurrency, generation, policy, round_number=0):
+    """One map step over md_text's chunks; returns the list of notes"""
+    chunks = _chunk_sections(split_markdown_sections(md_text))
+    target_chars = max(CONDENSE_MIN_CHARS, max_chars // len(chunks))
+    if round_number == 0:
+        print(f"📚 Long document ({len(md_text)} characters): condensing it in {len(chunks)} parts with {CONDENSE_MODEL}...")
+    else:
+        print(f"📚 Notes are {len(md_text)} characters: condensing them again in {len(chunks)} parts...")
+    
+    def condense(chunk):
+        try:
+            return _condense_chunk(chunk, target_chars, generation, policy)[:target_chars * 2]
+        except Exception as e:
+            print(f"⚠️  Could not condense a part ({e}), using its beginning instead")
+            return chunk[:target_chars]
+    
+    started = time.monotonic()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        notes = list(executor.map(condense, chunks))
+    print(f"✅ Condensed to {sum(len(n) for n in notes)} characters in {time.monotonic() - started:.1f}s")
+    return notes
+
+# --- Outline pre-digest ---
+# Before the AI call the markdown is reduced locally to an outline: the heading
+# tree, each section's lead sentence, every sentence or bullet with a figure in
+# it, the main bullets and candidate case studies. The model gets the facts it
+# builds slides from without the surrounding prose, which cuts input tokens
+# (and so latency and cost) for every carousel.
+PREDIGEST_ENABLED = os.getenv('CAROUSEL_PREDIGEST', '1') != '0'
+OUTLINE_MAX_ITEMS = 5  # Bullets without figures kept per section
+OUTLINE_MAX_WORDS = 60
+OUTLINE_MIN_CHARS = 300  # A shorter outline lost too much; the document is sent as is
+# Share of the input tokens the outline must save; below it the full text is worth sending
+OUTLINE_MIN_SAVINGS = float(os.getenv('CAROUSEL_PREDIGEST_MIN_SAVINGS', '0.1'))
+DIGIT_RE = re.compile(r"\d")
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+@functools.lru_cache(maxsize=1)
+def _token_encoding():
+    if tiktoken is None:
+        return None
     try:
-        # Truncate content if too long to fit within token limits
-        max_content_length = 3000  # Leave room for prompt and response
-        if len(md_text) > max_content_length:
-            md_text = md_text[:max_content_length] + "\n\n[Content truncated for processing...]"
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None  # Encoding files could not be loaded (e.g. offline)
+
+def estimate_tokens(text):
+    """Token count of text (tiktoken when installed, otherwise about 4 characters per token)"""
+    encoding = _token_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return (len(text) + 3) // 4
+
+def build_outline(md_text):
+    """Compact markdown outline of the facts in md_text (a string or a MarkdownIndex)"""
+    if isinstance(md_text, MarkdownIndex):
+        outlines = (build_outline(section["text"]) for section in md_text.iter_sections())
+        return "\n\n".join(outline for outline in outlines if outline)
+    lines = []
+    for section in _markdown_sections(md_text):
+        if section["heading"]:
+            if lines:
+                lines.append("")
+            lines.append("#" * max(1, section["level"]) + " " + section["heading"])
+        
+        seen = set()
+        
+        def add(text, prefix="- ", max_words=OUTLINE_MAX_WORDS):
+            text = _shorten(text, max_words)
+            if text not in seen:
+                seen.add(text)
+                lines.append(prefix + text)
         
-        prompt = f"""Create exactly 7-8 comprehensive LinkedIn carousel slides from this markdown content. Each slide should be detailed, informative, and engaging for business professionals. 
+        sentences = [s for p in section["paragraphs"] for s in _sentences(p)]
+        is_case = bool(section["heading"] and CASE_HEADING_RE.search(section["heading"]))
+        if is_case:
+            for paragraph in section["paragraphs"]:
+                add(paragraph, "> Case: ", 80)
+        else:
+            if sentences:
+                add(sentences[0])
+            for sentence in sentences:
+                if DIGIT_RE.search(sentence):
+                    add(sentence)
+        plain_items = 0
+        for item in section["items"]:
+            if DIGIT_RE.search(item):
+                add(item)
+            elif plain_items < OUTLINE_MAX_ITEMS:
+                plain_items += 1
+                add(item, max_words=40)
+        for quote in section["quotes"]:
+            add(quote, "> Case: ", 80)
+    return "\n".join(lines).strip()
+
+def predigest_markdown(md_text, generation=None, large=False):
+    """The outline to send instead of md_text, or md_text itself when the outline does not help.
+
+    ``large`` documents are outlined one section at a time and always use the outline.
+    """
+    if large:
+        with MarkdownIndex(md_text.encode("utf-8")) as index:
+            outline = build_outline(index)
+    else:
+        outline = build_outline(md_text)
+        if len(outline) < OUTLINE_MIN_CHARS and len(md_text) > OUTLINE_MIN_CHARS:
+            return md_text, False
+    raw_tokens, outline_tokens = estimate_tokens(md_text), estimate_tokens(outline)
+    saved = 1 - outline_tokens / raw_tokens if raw_tokens else 0
+    if not large and saved < OUTLINE_MIN_SAVINGS:
+        return md_text, False
+    print(f"🧮 Outline pre-digest: {raw_tokens:,} → {outline_tokens:,} content tokens (-{saved:.0%})")
+    if generation is not None:
+        generation["content_tokens_raw"] = raw_tokens
+        generation["content_tokens_sent"] = outline_tokens
+    return outline, True
+
+# --- Slide model ---
+# Slides are validated once, when they come out of the model (or the cache), into
+# small typed records. Every field of a record always exists, so the renderers
+# never have to guess; records convert back to plain dicts for the API and cache.
+MAX_SLIDE_ITEMS = 6
+
+class SlideValidationError(ValueError):
+    pass
+
+_SLIDE_FIELDS = {}  # Field names per record class, worked out once
+
+class Slide:
+    """Base of the typed slide records; subclasses list their fields in __slots__"""
+    __slots__ = ("type", "title")
+    LIST_FIELDS = ()      # Fields holding a list of strings
+    REQUIRED = ("title",)  # Fields that must not be empty
+
+    def __init__(self, type, **fields):
+        self.type = type
+        for name in self._fields():
+            default = () if name in self.LIST_FIELDS else ""
+            setattr(self, name, fields.get(name, default))
+
+    @classmethod
+    def _fields(cls):
+        fields = _SLIDE_FIELDS.get(cls)
+        if fields is None:
+            fields = _SLIDE_FIELDS[cls] = [name for klass in reversed(cls.__mro__) for name in getattr(klass, "__slots__", ()) if name != "type"]
+        return fields
+
+    @classmethod
+    def from_dict(cls, data):
+        """Validate a slide dict into a record, fixing the usual formatting slips"""
+        fields = {}
+        for name in cls._fields():
+            value = data.get(name)
+            if name in cls.LIST_FIELDS:
+                value = _slide_list(value)
+            else:
+                value = _slide_text(value)
+            if name in cls.REQUIRED and not value:
+                raise SlideValidationError(f"{data.get('type')} slide is missing '{name}'")
+            fields[name] = value
+        return cls(data["type"], **fields)
+
+    def to_dict(self):
+        data = {"type": self.type}
+        for name in self._fields():
+            value = getattr(self, name)
+            data[name] = list(value) if name in self.LIST_FIELDS else value
+        return data
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.title!r})"
+
+class TitleSlide(Slide):
+    __slots__ = ("subtitle", "highlight")
+
+class StatSlide(Slide):
+    __slots__ = ("subtitle", "stats")
+    LIST_FIELDS = ("stats",)
+    REQUIRED = ("title", "stats")
+
+class ListSlide(Slide):
+    __slots__ = ("subtitle", "description", "items")
+    LIST_FIELDS = ("items",)
+    REQUIRED = ("title", "items")
+
+class ResultsSlide(Slide):
+    __slots__ = ("subtitle", "description", "cases")
+    LIST_FIELDS = ("cases",)
+    REQUIRED = ("title", "cases")
+
+class RecommendationsSlide(Slide):
+    __slots__ = ("subtitle", "description", "sections")
+    LIST_FIELDS = ("sections",)
+    REQUIRED = ("title", "sections")
+
+class CtaSlide(Slide):
+    __slots__ = ("subtitle", "description", "steps", "highlight")
+    LIST_FIELDS = ("steps",)
+    REQUIRED = ("title", "steps")
+
+class FinalSlide(Slide):
+    __slots__ = ("subtitle", "description", "cta_text")
+
+SLIDE_TYPES = {
+    "title": TitleSlide,
+    "stat": StatSlide,
+    "list": ListSlide,
+    "platforms": ListSlide,
+    "comparison": ListSlide,
+    "tools": ListSlide,
+    "trends": ListSlide,
+    "capabilities": ListSlide,
+    "results": ResultsSlide,
+    "recommendations": RecommendationsSlide,
+    "cta": CtaSlide,
+    "final": FinalSlide,
+}
+
+def _slide_text(value):
+    if isinstance(value, list):
+        value = value[0] if value else ""
+    return "" if value is None else str(value).strip()
+
+def _slide_list(value):
+    if value is None:
+        return ()
+    if not isinstance(value, list):
+        value = [value]
+    flattened = []
+    for item in value:
+        # Flatten any nested arrays
+        flattened.extend(item if isinstance(item, list) else [item])
+    return tuple(str(item).strip() for item in flattened if str(item).strip())[:MAX_SLIDE_ITEMS]
+
+def slide_from_dict(data):
+    """Validate one slide dict into its typed record (raises SlideValidationError)"""
+    if isinstance(data, Slide):
+        return data
+    if not isinstance(data, dict):
+        raise SlideValidationError("Slide is not a JSON object")
+    slide_class = SLIDE_TYPES.get(data.get("type"))
+    if slide_class is None:
+        raise SlideValidationError(f"Unknown slide type: {data.get('type')!r}")
+    return slide_class.from_dict(data)
+
+def _text_schema():
+    return {"type": "string"}
 
-IMPORTANT: Return ONLY valid JSON with proper string formatting (no nested arrays). DO NOT include a final/CTA slide - we'll add that separately.
+def _list_schema():
+    return {"type": "array", "items": {"type": "string"}}
 
-YOU MUST GENERATE EXACTLY 7-8 CONTENT SLIDES. Here's the structure to follow:
+def _slide_schema(slide_type, slide_class):
+    properties = {"type": {"type": "string", "enum": [slide_type]}}
+    for name in slide_class._fields():
+        properties[name] = _list_schema() if name in slide_class.LIST_FIELDS else _text_schema()
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+# The slide types the model is asked for (the final CTA slide is added locally)
+GENERATED_SLIDE_TYPES = ("title", "stat", "list", "results")
+
+SLIDES_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "carousel_slides",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "slides": {
+                    "type": "array",
+                    "items": {"anyOf": [_slide_schema(t, SLIDE_TYPES[t]) for t in GENERATED_SLIDE_TYPES]},
+                },
+            },
+            "required": ["slides"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+# --- AI-powered content analysis and slide generation ---
+SYSTEM_PROMPT = "You are a LinkedIn content expert who creates comprehensive, detailed carousel slides. Always generate exactly 7-8 content slides with substantial, professional content."
+
+def build_slides_messages(md_text, outline=False):
+    """Chat messages asking the model for the carousel slides of md_text (or of its outline)"""
+    # Safety net only - long documents are condensed before they get here
+    max_content_length = DIRECT_CONTENT_CHARS * 2  # Leave room for prompt and response
+    if len(md_text) > max_content_length:
+        md_text = md_text[:max_content_length] + "\n\n[Content truncated for processing...]"
+    
+    source_note = (
+        "The content is a pre-digested outline of the report: its headings, each section's lead sentence, every sentence with a figure, the main bullets and candidate case studies (marked \"> Case:\")."
+        if outline else "The content is the report in markdown."
+    )
+    prompt = f"""Create exactly 7-8 comprehensive LinkedIn carousel slides from this content. Each slide should be detailed, informative, and engaging for business professionals. {source_note}
 
-[
-  {{"type": "title", "title": "Main Title", "subtitle": "Comprehensive subtitle", "highlight": "📊 Single key insight with context"}},
-  {{"type": "stat", "title": "Key Statistics & Market Data", "subtitle": "Numbers that matter", "stats": ["💰 Specific statistic with full context, implications, and business impact (40-60 words)", "📈 Detailed metric with background information and trend analysis (40-60 words)", "🎯 Important number with business impact explanation and context (40-60 words)", "🚀 Additional statistic with supporting details and relevance (40-60 words)"]}},
-  {{"type": "list", "title": "Core Concepts & Fundamentals", "subtitle": "Essential knowledge", "description": "Foundational understanding and key principles", "items": ["🚀 Comprehensive point with details and context (30-50 words)", "💡 In-depth insight with explanation and implications (30-50 words)", "📊 Detailed finding with context and business impact (30-50 words)", "🎯 Actionable takeaway with specific implementation steps (30-50 words)", "⚡ Additional insight with supporting details (30-50 words)"]}},
-  {{"type": "list", "title": "Platforms & Tools Analysis", "subtitle": "Technology landscape", "description": "Comprehensive overview of available solutions", "items": ["🔧 Platform analysis with features and capabilities (35-55 words)", "💼 Tool comparison with pros and cons (35-55 words)", "📱 Technology assessment with use cases (35-55 words)", "⚙️ Solution evaluation with implementation considerations (35-55 words)"]}},
-  {{"type": "results", "title": "Case Studies & Success Stories", "subtitle": "Proven outcomes and real results", "description": "Real-world examples and their significance", "cases": ["🏢 Detailed company case study with specific results, metrics, and implementation details (50-70 words)", "🚀 Comprehensive success story with metrics, timeline, and business impact (50-70 words)", "📊 In-depth example with measurable outcomes and lessons learned (50-70 words)"]}},
-  {{"type": "list", "title": "Implementation Strategies", "subtitle": "Practical approaches and methodologies", "description": "Step-by-step guidance for success", "items": ["🎯 Strategic approach with step-by-step implementation guidance (35-55 words)", "💡 Best practice with detailed explanation and expected outcomes (35-55 words)", "🔧 Practical methodology with tools and resources needed (35-55 words)", "📈 Success factor with measurement criteria and benchmarks (35-55 words)"]}},
-  {{"type": "list", "title": "Future Trends & Strategic Recommendations", "subtitle": "What's next and expert guidance", "description": "Forward-looking insights and strategic direction", "items": ["🚀 Emerging trend with impact analysis and preparation strategies (35-55 words)", "💡 Strategic recommendation with implementation timeline and resources (35-55 words)", "🎯 Future opportunity with market analysis and positioning advice (35-55 words)", "⚡ Innovation area with competitive advantage potential (35-55 words)", "🔮 Long-term prediction with strategic implications (35-55 words)"]}},
-  {{"type": "list", "title": "Advanced Insights & Expert Tips", "subtitle": "Professional guidance and best practices", "description": "Advanced strategies for maximum impact", "items": ["🎓 Expert insight with professional context and application (35-55 words)", "🏆 Advanced strategy with competitive advantages (35-55 words)", "💎 Premium tip with exclusive knowledge and benefits (35-55 words)", "🔥 Power technique with measurable results (35-55 words)"]}}
-]
+The response format fixes the slide fields. DO NOT include a final/CTA slide - we'll add that separately. Follow this slide plan:
+1. title - main title, comprehensive subtitle, one highlight with a key insight and its context
+2. stat - "Key Statistics & Market Data": 4 stats of 40-60 words with context, implications and business impact
+3. list - core concepts & fundamentals: description plus 5 items of 30-50 words
+4. list - platforms & tools analysis: 4 items of 35-55 words (features, pros and cons, use cases)
+5. results - case studies & success stories: 3 cases of 50-70 words with metrics, timeline and impact
+6. list - implementation strategies: 4 items of 35-55 words with concrete steps
+7. list - future trends & strategic recommendations: 5 items of 35-55 words
+8. list - advanced insights & expert tips: 4 items of 35-55 words
 
 CRITICAL REQUIREMENTS:
 - MUST generate exactly 7-8 content slides (excluding the final CTA slide we add separately)
-- Each slide must be substantial with detailed, professional content
-- "highlight" must be a SINGLE STRING, not an array
-- "items", "stats", "cases" must be arrays of strings
+- Adapt slide titles to the content; skip plan entries the content cannot support rather than inventing facts
 - Each bullet point should be 30-70 words with comprehensive context and explanations
 - Include specific numbers, percentages, and concrete examples where available
 - Use professional LinkedIn business language with actionable insights
-- Extract and elaborate on key statistics, case studies, and strategic recommendations
-- Use diverse, relevant emojis (no repetition within the same slide)
-- Focus on actionable business insights, practical takeaways, and strategic guidance
-- Make each slide substantial and informative for business decision-makers
-- DO NOT include a final/CTA slide in your response
+- Start every bullet with a relevant emoji (no repetition within the same slide)
 
 Content to analyze:
 {md_text}"""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
 
-        response = openai.chat.completions.create(
-            model="gpt-4",  # Using GPT-4 for better content quality and reasoning
-            messages=[
-                {"role": "system", "content": "You are a LinkedIn content expert who creates comprehensive, detailed carousel slides. Always generate exactly 7-8 content slides with substantial, professional content."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=4000  # Increased significantly for more detailed content
-        )
-        
-        # Parse the JSON response
-        content = response.choices[0].message.content.strip()
-        
-        # Clean up the response to ensure it's valid JSON
-        if content.startswith('```json'):
-            content = content[7:]
-        if content.startswith('```'):
-            content = content[3:]
-        if content.endswith('```'):
-            content = content[:-3]
-        
-        # Remove any leading/trailing whitespace and newlines
-        content = content.strip()
-        
-        # Try to find JSON array if response contains extra text
-        import re
-        json_match = re.search(r'\[.*\]', content, re.DOTALL)
-        if json_match:
-            content = json_match.group(0)
-        
-        slides = json.loads(content)
-        
-        # Validate that slides is a list
-        if not isinstance(slides, list):
-            raise ValueError("OpenAI response is not a valid list of slides")
-        
-        # Validate each slide has required fields
-        for i, slide in enumerate(slides):
-            if not isinstance(slide, dict) or 'type' not in slide:
-                raise ValueError(f"Slide {i} is not a valid slide object")
-            
-            # Fix any array fields that should be strings
-            if 'highlight' in slide and isinstance(slide['highlight'], list):
-                slide['highlight'] = slide['highlight'][0] if slide['highlight'] else "📊 Key insight"
+def _parse_slides_response(content):
+    """Parse a complete model response into a list of slide dicts"""
+    content = content.strip()
+    
+    # Clean up the response to ensure it's valid JSON
+    if content.startswith('```json'):
+        content = content[7:]
+    if content.startswith('```'):
+        content = content[3:]
+    if content.endswith('```'):
+        content = content[:-3]
+    
+    # Remove any leading/trailing whitespace and newlines
+    content = content.strip()
+    
+    # Try to find JSON array if response contains extra text
+    json_match = re.search(r'\[.*\]', content, re.DOTALL)
+    if json_match:
+        content = json_match.group(0)
+    
+    slides = json.loads(content)
+    
+    # Validate that slides is a list
+    if not isinstance(slides, list):
+        raise ValueError("OpenAI response is not a valid list of slides")
+    return slides
+
+def _normalize_slide(slide, i):
+    """Validate one slide from the model into a plain dict with every field present"""
+    try:
+        return slide_from_dict(slide).to_dict()
+    except SlideValidationError as e:
+        raise SlideValidationError(f"Slide {i}: {e}") from None
+
+class SlideStreamParser:
+    """Incrementally pulls slide objects out of a streamed JSON array.
+
+    Feed it text chunks as they arrive; every call returns the slide objects
+    whose closing brace was just seen. Objects are the direct elements of the
+    first JSON array in the stream, so markdown fences or a wrapping object
+    around the array do not matter.
+    """
+
+    def __init__(self):
+        self.text = []
+        self.closed = False
+        self._in_array = False
+        self._depth = 0
+        self._object = []
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk):
+        self.text.append(chunk)
+        slides = []
+        for ch in chunk:
+            if self.closed:
+                break
+            if not self._in_array:
+                self._in_array = ch == '['
+                continue
+            if self._depth == 0:
+                if ch == '{':
+                    self._depth = 1
+                    self._object = ['{']
+                elif ch == ']':
+                    self.closed = True
+                continue
             
-            # Ensure items/stats/cases are properly formatted
-            for field in ['items', 'stats', 'cases']:
-                if field in slide and isinstance(slide[field], list):
-                    # Flatten any nested arrays
-                    flattened = []
-                    for item in slide[field]:
-                        if isinstance(item, list):
-                            flattened.extend(item)
-                        else:
-                            flattened.append(str(item))
-                    slide[field] = flattened[:6]  # Limit to 6 items max
-        
-        print(f"✅ Generated {len(slides)} slides using OpenAI gpt-4")
+            self._object.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in '{[':
+                self._depth += 1
+            elif ch in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    slides.append(json.loads("".join(self._object)))
         return slides
+
+    def full_text(self):
+        return "".join(self.text)
+
+def stream_slides_with_ai(md_text, use_cache=LLM_CACHE_ENABLED, report=None, offline=None):
+    """Generator version of generate_slides_with_ai that yields slides as they are written.
+
+    The completion is consumed as a token stream and each slide is parsed and
+    yielded as soon as its JSON object closes, so callers can preview or render
+    slide 1 while later slides are still being generated. Every generation is
+    recorded in the LLM telemetry store; pass a dict as ``report`` to also get
+    that record (model, cache hit, fallback, tokens, latency) back. With
+    ``offline`` (default: CAROUSEL_OFFLINE) the local slide engine is used and
+    no AI call is made.
+    """
+    generation = {
+        "kind": "generation",
+        "generation_id": uuid.uuid4().hex[:12],
+        "model": LLM_MODEL,
+        "slides": 0,
+        "cache_hit": False,
+        "fell_back": False,
+        "fallback_reason": None,
+        "offline": OFFLINE_MODE if offline is None else offline,
+    }
+    started = time.monotonic()
+    try:
+        for slide in _stream_slides(md_text, use_cache, generation):
+            generation["slides"] += 1
+            yield slide
+    finally:
+        generation["latency_s"] = round(time.monotonic() - started, 3)
+        record_llm_event(generation)
+        if report is not None:
+            report.update(generation)
+
+def _stream_slides(md_text, use_cache, generation):
+    if generation["offline"]:
+        generation["model"] = "local"
+        yield from markdown_to_slides(md_text)
+        return
+    
+    if not llm_available():
+        print("⚠️  OpenAI API key not found. Please set OPENAI_API_KEY in .env file.")
+        print("   Building slides locally from the markdown structure instead...")
+        generation.update(fell_back=True, fallback_reason="no_api_key")
+        yield from create_fallback_slides(md_text)
+        return
+    
+    cache_key = llm_cache_key(md_text) if use_cache else None
+    if cache_key is not None:
+        slides = _cached_slides(cache_key)
+        if slides is not None:
+            print(f"✅ Loaded {len(slides)} slides from the response cache")
+            generation["cache_hit"] = True
+            yield from slides
+            return
+    
+    slides = []
+    policy = LLMCallPolicy()
+    try:
+        large = is_large_markdown(md_text)
+        if PREDIGEST_ENABLED or large:
+            content, is_outline = predigest_markdown(md_text, generation, large)
+        else:
+            content, is_outline = md_text, False
+        content = condense_markdown(content, generation=generation, policy=policy)
+        attempt = 0
+        while True:
+            policy.check_deadline()
+            model = policy.model()
+            try:
+                yield from _stream_slides_attempt(content, model, policy, generation, attempt, slides, is_outline)
+                break
+            except Exception as e:
+                # Slides that already reached the caller cannot be taken back, so only retry before the first one
+                if slides or not policy.wait_before_retry("slides", model, attempt, e):
+                    raise
+                attempt += 1
+        generation["model"] = model
         
+        backend = "OpenAI" if LLM_BACKEND == "openai" else f"the {LLM_BACKEND} LLM backend"
+        print(f"✅ Generated {len(slides)} slides using {backend} {model}")
+        if cache_key is not None and model == LLM_MODEL:
+            get_llm_cache().set(cache_key, json.dumps(slides, ensure_ascii=False).encode("utf-8"))
+            get_similar_index().add(cache_key, md_text)
+    
     except Exception as e:
         print(f"⚠️  OpenAI API error: {e}")
-        print("   Falling back to basic parsing...")
-        return create_fallback_slides(md_text)
+        if slides:
+            # Keep what already reached the caller rather than mixing in placeholder slides
+            print(f"   Keeping the {len(slides)} slides received before the error")
+            generation["fallback_reason"] = f"partial: {e}"
+            return
+        print("   Building slides locally from the markdown structure instead...")
+        generation.update(fell_back=True, fallback_reason=str(e) or type(e).__name__)
+        yield from create_fallback_slides(md_text)
 
-def create_fallback_slides(md_text):
-    """Fallback method if OpenAI API is not available"""
-    title_match = re.search(r'^# (.+)', md_text, re.MULTILINE)
-    main_title = title_match.group(1).strip() if title_match else INPUT_MD.replace('.md', '').replace('_', ' ').replace('-', ' ').title()
+def _stream_slides_attempt(content, model, policy, generation, attempt, slides, outline=False):
+    """One streamed slide completion; yields each slide as its JSON closes and appends it to slides"""
+    with LLMCallRecord("slides", model, generation, attempt) as call:
+        stream = get_llm_client().chat.completions.create(
+            model=model,
+            messages=build_slides_messages(content, outline),
+            response_format=SLIDES_RESPONSE_FORMAT,
+            temperature=LLM_TEMPERATURE,
+            max_tokens=4000,  # Increased significantly for more detailed content
+            stream=True,
+            stream_options={"include_usage": True},
+            timeout=policy.request_timeout()
+        )
+        
+        parser = SlideStreamParser()
+        for chunk in stream:
+            policy.check_deadline()
+            call.usage(getattr(chunk, "usage", None))
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            call.first_token()
+            for slide in parser.feed(delta):
+                try:
+                    slide = _normalize_slide(slide, len(slides))
+                except SlideValidationError as e:
+                    print(f"⚠️  Skipping invalid slide: {e}")
+                    continue
+                slides.append(slide)
+                yield slide
     
+    if not slides:
+        # Nothing streamed as a clean array - parse the whole response the old way
+        for slide in _parse_slides_response(parser.full_text()):
+            slide = _normalize_slide(slide, len(slides))
+            slides.append(slide)
+            yield slide
+
+def generate_slides_with_ai(md_text, use_cache=LLM_CACHE_ENABLED, on_slide=None, report=None, offline=None):
+    """Use OpenAI to intelligently parse markdown and create structured slides
+
+    Results are served from the LLM response cache when the same markdown was
+    converted before; pass ``use_cache=False`` to force a fresh generation.
+    ``on_slide(slide, index)`` is called for every slide as soon as it arrives.
+    """
+    slides = []
+    for slide in stream_slides_with_ai(md_text, use_cache=use_cache, report=report, offline=offline):
+        if on_slide is not None:
+            on_slide(slide, len(slides))
+        slides.append(slide)
+    return slides
+
+# --- Single-slide regeneration ---
+# One weak slide can be rewritten on its own: the model gets the slide, its
+# neighbours and only the source sections that slide draws on, and must answer
+# with one slide of the same type. That is a small fraction of a full run.
+REGENERATE_CONTEXT_CHARS = 3000
+REGENERATE_BUDGET_S = float(os.getenv('CAROUSEL_REGENERATE_BUDGET_S', '45'))
+WORD_RE = re.compile(r"\w+")
+
+def _content_words(text):
+    """Lower-cased words that carry meaning: numbers and words of 4+ letters"""
+    return {w for w in WORD_RE.findall(text.lower()) if len(w) >= 4 or any(c.isdigit() for c in w)}
+
+def slide_text(slide):
+    """All visible text of a slide as one string"""
+    record = slide_from_dict(slide)
+    parts = []
+    for name in record._fields():
+        value = getattr(record, name)
+        parts.extend(value if name in record.LIST_FIELDS else [value])
+    return "\n".join(p for p in parts if p)
+
+def slide_section_overlap(slide, sections):
+    """Score how much of the slide's wording comes from each section (0..1, aligned with sections).
+
+    Words are weighted by how specific they are to a section (inverse document
+    frequency), so vocabulary shared by the whole report does not count.
+    """
+    words = _content_words(slide_text(slide))
+    section_words = [_content_words(section["text"]) for section in sections]
+    if not words or not sections:
+        return [0.0] * len(sections)
+    document_frequency = collections.Counter(w for sw in section_words for w in sw & words)
+    weights = {w: math.log((len(sections) + 1) / (document_frequency[w] + 0.5)) for w in words}
+    total = sum(weights.values())
+    return [sum(weights[w] for w in words & sw) / total for sw in section_words]
+
+def _source_excerpt(md_text, slide, max_chars=REGENERATE_CONTEXT_CHARS):
+    """The source sections a slide draws on most, in document order, up to max_chars"""
+    sections = split_markdown_sections(md_text)
+    scores = slide_section_overlap(slide, sections)
+    picked, used = [], 0
+    for i in sorted(range(len(sections)), key=lambda i: scores[i], reverse=True):
+        if scores[i] == 0 or used >= max_chars:
+            break
+        picked.append(i)
+        used += len(sections[i]["text"])
+    if not picked:
+        return md_text[:max_chars]
+    return "".join(sections[i]["text"] for i in sorted(picked))[:max_chars]
+
+def build_regenerate_messages(md_text, slides, index, instructions=None):
+    """Chat messages asking for a replacement of slides[index]"""
+    slide = slides[index]
+    def neighbour(i):
+        return json.dumps(slides[i], ensure_ascii=False) if 0 <= i < len(slides) else "(none)"
+    extra = f"\nExtra instructions from the author: {instructions}\n" if instructions else ""
+    prompt = f"""Rewrite slide {index + 1} of this {len(slides)}-slide LinkedIn carousel. The author found it weak.
+Write a stronger replacement of the same type ("{slide['type']}") on the same topic, with the same depth as the rest of the carousel: 30-70 words per bullet, specific numbers and concrete examples from the source, diverse relevant emojis. Do not repeat points made on the neighbouring slides.
+{extra}
+Current slide:
+{neighbour(index)}
+
+Previous slide:
+{neighbour(index - 1)}
+
+Next slide:
+{neighbour(index + 1)}
+
+Relevant source content:
+{_source_excerpt(md_text, slide)}"""
     return [
-        {
-            "type": "title",
-            "title": main_title,
-            "subtitle": "Professional Guide & Analysis",
-            "highlight": "📊 Comprehensive Overview"
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+def _slide_response_format(slide_type):
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "carousel_slide",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {"slide": _slide_schema(slide_type, SLIDE_TYPES[slide_type])},
+                "required": ["slide"],
+                "additionalProperties": False,
+            },
         },
-        {
+    }
+
+def regenerate_slide(md_text, slides, index, instructions=None):
+    """Regenerate slides[index] with a small targeted completion and return the new slide.
+
+    The list itself is not modified. Raises on API errors instead of falling
+    back, so the caller can keep the current slide.
+    """
+    slide = slide_from_dict(slides[index]).to_dict()
+    if slide["type"] == "final":
+        raise ValueError("The final slide is fixed and cannot be regenerated")
+    if not llm_available():
+        raise RuntimeError("OpenAI API key not found. Please set OPENAI_API_KEY in .env file.")
+    
+    generation = {"kind": "regeneration", "generation_id": uuid.uuid4().hex[:12], "model": LLM_MODEL, "slide_index": index}
+    policy = LLMCallPolicy(budget_s=REGENERATE_BUDGET_S)
+    messages = build_regenerate_messages(md_text, slides, index, instructions)
+    started = time.monotonic()
+    try:
+        response = policy.call(
+            "regenerate",
+            lambda model, timeout: get_llm_client().chat.completions.create(
+                model=model,
+                messages=messages,
+                response_format=_slide_response_format(slide["type"]),
+                temperature=LLM_TEMPERATURE,
+                max_tokens=1000,
+                timeout=timeout
+            ),
+            generation
+        )
+        new_slide = _normalize_slide(json.loads(response.choices[0].message.content)["slide"], index)
+        generation["model"] = policy.last_model
+    except Exception as e:
+        generation["error"] = str(e) or type(e).__name__
+        raise
+    finally:
+        generation["latency_s"] = round(time.monotonic() - started, 3)
+        record_llm_event(generation)
+    print(f"✅ Regenerated slide {index + 1}: {new_slide['title']}")
+    return new_slide
+
+# --- Near-duplicate reports ---
+# Every generated report is fingerprinted with a 64-bit SimHash over word
+# shingles of its normalized markdown. A new upload whose fingerprint is within
+# SIMILAR_THRESHOLD of an earlier one (a typo fix, a new date) can reuse that
+# run's cached slides, optionally regenerating just the slides whose source
+# sections changed.
+SIMILAR_INDEX_DIR = os.getenv('CAROUSEL_SIMILAR_INDEX_DIR', os.path.join("temp", "similar_index"))
+SIMILAR_THRESHOLD = float(os.getenv('CAROUSEL_SIMILAR_THRESHOLD', '0.95'))  # Share of equal SimHash bits
+SIMILAR_INDEX_MAX_ENTRIES = 500
+SIMHASH_BITS = 64
+SIMHASH_SHINGLE_WORDS = 3
+
+def simhash(md_text, shingle_words=SIMHASH_SHINGLE_WORDS):
+    """64-bit SimHash of the normalized markdown's word shingles"""
+    words = WORD_RE.findall(normalize_markdown(md_text).lower())
+    shingles = collections.Counter(
+        " ".join(words[i:i + shingle_words]) for i in range(max(1, len(words) - shingle_words + 1))
+    )
+    weights = [0] * SIMHASH_BITS
+    for shingle, count in shingles.items():
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += count if value >> bit & 1 else -count
+    return sum(1 << bit for bit in range(SIMHASH_BITS) if weights[bit] > 0)
+
+def simhash_similarity(a, b):
+    return 1 - bin(a ^ b).count("1") / SIMHASH_BITS
+
+def _section_hash(section):
+    return hashlib.sha256(normalize_markdown(section["text"]).encode("utf-8")).hexdigest()[:16]
+
+class SimilarityIndex:
+    """Fingerprints of previously generated reports, with their markdown for section diffs"""
+
+    def __init__(self, directory=SIMILAR_INDEX_DIR, max_entries=SIMILAR_INDEX_MAX_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = None
+
+    @property
+    def _index_path(self):
+        return os.path.join(self.directory, "index.json")
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                with open(self._index_path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def _save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self._index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self._index_path)
+
+    def add(self, key, md_text):
+        """Remember the report whose slides are cached under key"""
+        with self._lock:
+            entries = self._load()
+            entries[key] = {"simhash": simhash(md_text), "ts": round(time.time(), 3), "chars": len(md_text)}
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, key + ".md"), "w", encoding="utf-8") as f:
+                f.write(md_text)
+            while len(entries) > self.max_entries:
+                oldest = min(entries, key=lambda k: entries[k]["ts"])
+                del entries[oldest]
+                with contextlib.suppress(OSError):
+                    os.remove(os.path.join(self.directory, oldest + ".md"))
+            self._save()
+
+    def nearest(self, md_text, threshold=SIMILAR_THRESHOLD, exclude=None):
+        """(similarity, key) of the most similar earlier report at or above threshold, or None"""
+        fingerprint = simhash(md_text)
+        with self._lock:
+            entries = dict(self._load())
+        best = None
+        for key, entry in entries.items():
+            if key == exclude:
+                continue
+            similarity = simhash_similarity(fingerprint, entry["simhash"])
+            if similarity >= threshold and (best is None or similarity > best[0]):
+                best = (similarity, key)
+        return best
+
+    def markdown(self, key):
+        try:
+            with open(os.path.join(self.directory, key + ".md"), "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+_similar_index = None
+
+def get_similar_index():
+    global _similar_index
+    if _similar_index is None:
+        _similar_index = SimilarityIndex()
+    return _similar_index
+
+def find_similar_generation(md_text, threshold=SIMILAR_THRESHOLD):
+    """Cached slides of an earlier, nearly identical report, or None.
+
+    Returns a dict with ``similarity``, the earlier ``markdown`` and ``slides``,
+    and ``stale_slides``: indexes of slides drawn from sections that changed.
+    Exact repeats are left to the response cache and are not reported here.
+    """
+    index = get_similar_index()
+    match = index.nearest(md_text, threshold, exclude=llm_cache_key(md_text))
+    if match is None:
+        return None
+    similarity, key = match
+    slides = _cached_slides(key, record=False)  # Only an offer, not a cache hit
+    previous_md = index.markdown(key)
+    if slides is None or previous_md is None:
+        return None
+    return {
+        "key": key,
+        "similarity": round(similarity, 3),
+        "markdown": previous_md,
+        "slides": slides,
+        "stale_slides": stale_slide_indexes(previous_md, md_text, slides),
+    }
+
+def stale_slide_indexes(previous_md, md_text, slides):
+    """Indexes of slides whose main source section in previous_md is gone or edited in md_text"""
+    previous_sections = split_markdown_sections(previous_md)
+    current_hashes = {_section_hash(section) for section in split_markdown_sections(md_text)}
+    changed = [_section_hash(section) not in current_hashes for section in previous_sections]
+    if not any(changed):
+        return []
+    stale = []
+    for i, slide in enumerate(slides):
+        if slide.get("type") == "final":
+            continue
+        scores = slide_section_overlap(slide, previous_sections)
+        if scores and max(scores) > 0 and changed[scores.index(max(scores))]:
+            stale.append(i)
+    return stale
+
+def reuse_similar_generation(md_text, match, refresh=True, on_slide=None):
+    """Slides for md_text built from an earlier near-duplicate match.
+
+    With ``refresh`` the stale slides are regenerated one by one against the new
+    markdown (``on_slide(slide, index)`` is called for each); a slide that fails
+    to regenerate keeps its earlier version.
+    """
+    slides = [dict(slide) for slide in match["slides"]]
+    if refresh:
+        for i in match["stale_slides"]:
+            try:
+                slides[i] = regenerate_slide(md_text, slides, i)
+            except Exception as e:
+                print(f"⚠️  Could not refresh slide {i + 1} ({e}), keeping the earlier version")
+            if on_slide is not None:
+                on_slide(slides[i], i)
+    print(f"♻️  Reused {len(slides)} slides from a {match['similarity']:.0%} similar report, {len(match['stale_slides']) if refresh else 0} refreshed")
+    return slides
+
+# --- Local slide engine ---
+# A deterministic, offline markdown-to-slides converter. The markdown is parsed
+# into HTML and walked section by section: the first heading becomes the title
+# slide, sentences with figures feed a statistics slide, case-study sections and
+# quotes become a results slide and every other section a list slide. It runs
+# in milliseconds and is used for offline mode and whenever the AI is unavailable.
+OFFLINE_MODE = os.getenv('CAROUSEL_OFFLINE', '0') == '1'
+LOCAL_MAX_SLIDES = 8
+LOCAL_MAX_ITEM_WORDS = 60
+STAT_RE = re.compile(r"[$€£]\s?\d|\d[\d,.]*\s?(?:%|percent\b|x\b|[kKmMbB]\b|bn\b|million\b|billion\b|thousand\b)")
+CASE_HEADING_RE = re.compile(r"case|stud(?:y|ies)|success|customer|client|example|result|outcome", re.IGNORECASE)
+LIST_ITEM_RE = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+\S")
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'“(])")
+LOCAL_EMOJIS = {
+    "stat": ["💰", "📈", "🎯", "🚀", "📊", "⚡"],
+    "list": ["🚀", "💡", "📊", "🎯", "⚡", "🔧"],
+    "results": ["🏢", "🚀", "📊", "🏆"],
+}
+
+def _clean_text(text):
+    return re.sub(r"\s+", " ", text).strip()
+
+def _shorten(text, max_words=LOCAL_MAX_ITEM_WORDS):
+    words = text.split()
+    if len(words) <= max_words:
+        return text
+    return " ".join(words[:max_words]).rstrip(",;:") + "…"
+
+def _with_emoji(text, emojis, i):
+    if text[:1] and ord(text[0]) >= 0x2100 and not text[0].isalnum():
+        return text  # Already starts with an emoji
+    return f"{emojis[i % len(emojis)]} {text}"
+
+def _sentences(text):
+    return [s for s in (_clean_text(part) for part in SENTENCE_RE.split(text)) if len(s) > 3]
+
+_markdown_parsers = threading.local()
+
+def _markdown_tree(md_text):
+    """The markdown rendered to HTML and parsed with BeautifulSoup"""
+    # Building a Markdown instance costs more than converting a section, so each thread keeps one
+    parser = getattr(_markdown_parsers, "parser", None)
+    if parser is None:
+        parser = _markdown_parsers.parser = markdown.Markdown(extensions=["extra"])
+    # Python-Markdown only starts a list after a blank line; most reports don't leave one
+    lines = []
+    in_fence = False
+    for line in md_text.split("\n"):
+        if line.lstrip().startswith(("```", "~~~")):
+            in_fence = not in_fence
+        if not in_fence and lines and lines[-1].strip() and LIST_ITEM_RE.match(line) and not LIST_ITEM_RE.match(lines[-1]) and not lines[-1].startswith((" ", "\t")):
+            lines.append("")
+        lines.append(line)
+    html = parser.reset().convert("\n".join(lines))
+    return BeautifulSoup(html, "html.parser")
+
+def _element_text(element, skip=("ul", "ol")):
+    parts = []
+    for child in element.children:
+        if isinstance(child, Comment):
+            continue
+        if isinstance(child, NavigableString):
+            parts.append(str(child))
+        elif child.name == "img":
+            parts.append(child.get("alt", ""))
+        elif child.name not in skip:
+            parts.append(_element_text(child, skip))
+    return _clean_text("".join(parts))
+
+def _markdown_sections(md_text):
+    """Headings with the paragraphs, list items and quotes under them, in document order"""
+    sections = []
+    
+    def new_section(heading=None, level=0):
+        section = {"heading": heading, "level": level, "paragraphs": [], "items": [], "quotes": []}
+        sections.append(section)
+        return section
+    
+    def walk(parent, section):
+        for element in parent.children:
+            tag = element.name
+            if tag is None:
+                continue  # Text between blocks
+            if len(tag) == 2 and tag[0] == "h" and tag[1].isdigit():
+                section = new_section(_element_text(element), int(tag[1]))
+            elif tag == "p":
+                text = _element_text(element)
+                if text:
+                    section["paragraphs"].append(text)
+            elif tag in ("ul", "ol"):
+                for item in element.find_all("li"):
+                    text = _element_text(item)  # Only the item's own text; nested lists are items of their own
+                    if text:
+                        section["items"].append(text)
+            elif tag == "blockquote":
+                text = _element_text(element, skip=())
+                if text:
+                    section["quotes"].append(text)
+            elif tag == "table":
+                for row in element.find_all("tr"):
+                    cells = [_element_text(cell) for cell in row.find_all("td", recursive=False)]
+                    if any(cells):
+                        section["items"].append(" · ".join(cell for cell in cells if cell))
+            else:
+                section = walk(element, section)
+        return section
+    
+    walk(_markdown_tree(md_text), new_section())
+    return [s for s in sections if s["heading"] or s["paragraphs"] or s["items"] or s["quotes"]]
+
+def markdown_to_slides(md_text, title=None):
+    """Convert markdown to title/stat/list/results slides without any AI call"""
+    sections = _markdown_sections(md_text)
+    heading = next((s["heading"] for s in sections if s["level"] == 1), None)
+    heading = heading or next((s["heading"] for s in sections if s["heading"]), None)
+    main_title = title or heading or _shorten(_clean_text(md_text.strip().split("\n", 1)[0].lstrip("#")), 10) or "Key Insights"
+    
+    sentences = [s for section in sections for p in section["paragraphs"] for s in _sentences(p)]
+    stats = []
+    for section in sections:
+        for text in section["items"] + [s for p in section["paragraphs"] for s in _sentences(p)]:
+            if STAT_RE.search(text) and text not in stats:
+                stats.append(text)
+    
+    highlight = stats[0] if stats else (sentences[0] if sentences else main_title)
+    slides = [{
+        "type": "title",
+        "title": main_title,
+        "subtitle": _shorten(sentences[0], 20) if sentences and sentences[0] != highlight else "Professional Guide & Analysis",
+        "highlight": _with_emoji(_shorten(highlight, 25), ["📊"], 0),
+    }]
+    if len(stats) >= 2:
+        slides.append({
+            "type": "stat",
+            "title": "Key Statistics & Market Data",
+            "subtitle": "Numbers that matter",
+            "stats": [_with_emoji(_shorten(s), LOCAL_EMOJIS["stat"], i) for i, s in enumerate(stats[:4])],
+        })
+    
+    content_slides = []
+    for order, section in enumerate(sections):
+        if section["level"] <= 1 and not section["items"] and not section["quotes"]:
+            continue  # Intro text under the title (or before any heading) is used on the title slide
+        paragraph_sentences = [s for p in section["paragraphs"] for s in _sentences(p)]
+        is_case = bool(section["quotes"]) or bool(section["heading"] and CASE_HEADING_RE.search(section["heading"]))
+        if is_case:
+            cases = section["quotes"] + section["paragraphs"] + section["items"]
+            if not cases:
+                continue
+            slide = {
+                "type": "results",
+                "title": section["heading"] or "Case Studies & Success Stories",
+                "subtitle": "Proven outcomes and real results",
+                "description": "",
+                "cases": [_with_emoji(_shorten(c, 70), LOCAL_EMOJIS["results"], i) for i, c in enumerate(cases[:3])],
+            }
+        else:
+            items = section["items"] or paragraph_sentences[1:] or paragraph_sentences
+            if not items:
+                continue
+            slide = {
+                "type": "list",
+                "title": section["heading"] or main_title,
+                "subtitle": "",
+                "description": _shorten(paragraph_sentences[0], 25) if section["items"] and paragraph_sentences else "",
+                "items": [_with_emoji(_shorten(item), LOCAL_EMOJIS["list"], i) for i, item in enumerate(items[:5])],
+            }
+        weight = sum(len(text) for text in section["paragraphs"] + section["items"] + section["quotes"])
+        content_slides.append((weight, order, slide))
+    
+    # Keep the most substantial sections, in document order
+    room = LOCAL_MAX_SLIDES - len(slides)
+    kept = sorted(sorted(content_slides, key=lambda c: -c[0])[:room], key=lambda c: c[1])
+    slides.extend(slide for _, _, slide in kept)
+    
+    if len(slides) == 1:
+        lines = [_clean_text(line.lstrip("#-*> ")) for line in md_text.splitlines()]
+        items = [line for line in lines if line and line != main_title][:5] or [main_title]
+        slides.append({
             "type": "list",
             "title": "Key Insights",
             "subtitle": "Main takeaways",
-            "description": "Essential information from the content",
-            "items": [
-                "🚀 Important point one",
-                "💡 Key insight two", 
-                "📊 Critical finding three"
-            ]
-        }
-    ]
+            "description": "",
+            "items": [_with_emoji(_shorten(item), LOCAL_EMOJIS["list"], i) for i, item in enumerate(items)],
+        })
+    return [_normalize_slide(slide, i) for i, slide in enumerate(slides)]
+
+def create_fallback_slides(md_text):
+    """Slides built locally, without AI (offline mode and fallback when OpenAI is unavailable)"""
+    return markdown_to_slides(md_text)
+
+# --- Incremental regeneration ---
+# A converted file leaves a manifest in MANIFEST_DIR: a content hash per
+# heading-delimited section, the slides, and the sections each slide was drawn
+# from. When the file is converted again, only slides whose source sections
+# were edited are regenerated (one small completion each); the rest are reused.
+# Added or removed sections, or edits to most of the document, mean a full run.
+INCREMENTAL_ENABLED = os.getenv('CAROUSEL_INCREMENTAL', '1') != '0'
+MANIFEST_DIR = os.getenv('CAROUSEL_MANIFEST_DIR', os.path.join("temp", "manifests"))
+INCREMENTAL_MAX_EDITED = 0.5  # Share of edited sections above which everything is regenerated
+SLIDE_SOURCE_MIN_SHARE = 0.6  # Sections scoring at least this share of a slide's best match count as its sources
+
+def _section_ids(sections):
+    """Stable identity per section: its heading plus the occurrence number of that heading"""
+    seen = collections.Counter()
+    ids = []
+    for section in sections:
+        seen[section["heading"]] += 1
+        ids.append(f"{section['heading'] or ''}#{seen[section['heading']]}")
+    return ids
+
+def slide_source_sections(slide, sections):
+    """Indexes of the sections a slide draws on"""
+    scores = slide_section_overlap(slide, sections)
+    best = max(scores, default=0)
+    if best <= 0:
+        return []
+    return [i for i, score in enumerate(scores) if score >= best * SLIDE_SOURCE_MIN_SHARE]
+
+def _manifest_path(source_id):
+    return os.path.join(MANIFEST_DIR, hashlib.sha256(source_id.encode("utf-8")).hexdigest()[:32] + ".json")
+
+def load_manifest(source_id):
+    try:
+        with open(_manifest_path(source_id), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # Slides from the stand-in or replay backends must never be served to real runs
+    if (manifest.get("model") != LLM_MODEL or manifest.get("prompt_version") != PROMPT_VERSION
+            or manifest.get("backend", "openai") != LLM_BACKEND):
+        return None
+    return manifest
+
+def save_manifest(source_id, md_text, slides, keep_hashes=None):
+    """Record md_text's section hashes and slides; keep_hashes (id -> hash) pins sections whose slides are still outdated"""
+    keep_hashes = keep_hashes or {}
+    sections = split_markdown_sections(md_text)
+    manifest = {
+        "source": source_id,
+        "model": LLM_MODEL,
+        "prompt_version": PROMPT_VERSION,
+        "backend": LLM_BACKEND,
+        "updated_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "sections": [
+            {"id": section_id, "hash": keep_hashes.get(section_id) or _section_hash(section)}
+            for section_id, section in zip(_section_ids(sections), sections)
+        ],
+        "slides": slides,
+        "slide_sources": [slide_source_sections(slide, sections) for slide in slides],
+    }
+    os.makedirs(MANIFEST_DIR, exist_ok=True)
+    path = _manifest_path(source_id)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(path + ".tmp", path)
+
+def plan_incremental_update(manifest, md_text):
+    """Indexes of the manifest's slides to regenerate for md_text, or None when a full run is needed"""
+    sections = split_markdown_sections(md_text)
+    current = dict(zip(_section_ids(sections), (_section_hash(s) for s in sections)))
+    previous = {s["id"]: s["hash"] for s in manifest["sections"]}
+    if set(current) != set(previous):
+        return None  # Sections were added, removed or renamed
+    edited = {i for i, s in enumerate(manifest["sections"]) if current[s["id"]] != s["hash"]}
+    if len(edited) > len(previous) * INCREMENTAL_MAX_EDITED:
+        return None
+    return [i for i, sources in enumerate(manifest["slide_sources"]) if edited & set(sources)]
+
+def generate_slides_incremental(md_text, source_id, on_slide=None, report=None):
+    """Slides for md_text, regenerating only what changed since source_id was last converted"""
+    report = {} if report is None else report
+    manifest = load_manifest(source_id) if INCREMENTAL_ENABLED and not OFFLINE_MODE else None
+    stale = plan_incremental_update(manifest, md_text) if manifest else None
+    
+    if stale is None:
+        slides = generate_slides_with_ai(md_text, on_slide=on_slide, report=report)
+        slides = [slide for slide in slides if slide.get("type") != "final"]
+        # Fallback and partial (truncated) carousels must not be reused on later runs
+        if not report.get("fell_back") and not report.get("fallback_reason") and not report.get("offline"):
+            save_manifest(source_id, md_text, slides)
+        return slides
+    
+    slides = [dict(slide) for slide in manifest["slides"]]
+    print(f"♻️  Incremental run: {len(stale)} of {len(slides)} slides draw on edited sections")
+    regenerated, failed = 0, []
+    for i in stale:
+        try:
+            slides[i] = regenerate_slide(
+                md_text, slides, i,
+                "Its source section was edited. Update the slide to match the current content and keep what is still accurate."
+            )
+            regenerated += 1
+        except Exception as e:
+            print(f"⚠️  Could not regenerate slide {i + 1} ({e}), keeping the earlier version")
+            failed.append(i)
+    for i, slide in enumerate(slides):
+        if on_slide is not None:
+            on_slide(slide, i)
+    report.update(incremental=True, regenerated=regenerated, regenerate_failed=len(failed))
+    # Sections behind a slide that kept its earlier version keep their old hash, so
+    # the next run still sees them as edited and retries that slide
+    keep_hashes = {
+        manifest["sections"][section]["id"]: manifest["sections"][section]["hash"]
+        for i in failed for section in manifest["slide_sources"][i]
+    }
+    save_manifest(source_id, md_text, slides, keep_hashes)
+    return slides
 
 def process_markdown_to_carousel(input_md, output_html, output_pdf):
     """Main processing function to convert markdown to carousel"""
     # Read the markdown file
     md_text = read_markdown_file(input_md)
     
-    # Generate slides using AI
-    slides_content = generate_slides_with_ai(md_text)
+    # Generate slides using AI, reporting each slide as soon as it is written;
+    # after an edit only the slides drawn from changed sections are regenerated
+    slides_content = generate_slides_incremental(
+        md_text,
+        os.path.abspath(input_md),
+        on_slide=lambda slide, index: print(f"   📄 Slide {index + 1}: {slide.get('title', 'Untitled')}")
+    )
 
     # Remove any final slides that might have been generated by AI or fallback
     slides_content = [slide for slide in slides_content if slide.get("type") != "final"]
@@ -261,116 +2098,248 @@ def add_final_slide(slides_content):
     slides_content.append(final_slide)
     return slides_content
 
-# --- Generate professional HTML ---
-def create_slide_html(slide):
-    if slide["type"] == "title":
-        return f"""
+# --- Logo assets ---
+# Each logo is read once per process and pre-scaled to the largest box it is
+# displayed in (at the render device scale factor), so Chromium never decodes the
+# full 1200px originals. Rendered pages get them from memory through request
+# interception; standalone HTML can embed them as cached data URIs.
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+LOGO_DISPLAY_PX = {"logo.png": 180, "logo-white.png": 250, "logo-dark.png": 180}
+ASSET_SCALE = 2  # Matches the PDF device_scale_factor
+
+_assets = {}
+_asset_lock = threading.Lock()
+
+def get_asset(name):
+    """PNG bytes of a logo, pre-scaled to its display size (None if the file is missing)"""
+    with _asset_lock:
+        if name in _assets:
+            return _assets[name]
+        try:
+            with open(os.path.join(APP_DIR, name), "rb") as f:
+                data = f.read()
+        except OSError:
+            data = None
+        if data is not None:
+            data = _downscale_png(data, LOGO_DISPLAY_PX.get(name, 180) * ASSET_SCALE)
+        _assets[name] = data
+        return data
+
+def _downscale_png(data, max_px):
+    """Shrink a PNG so its longest side is at most max_px (needs Pillow, otherwise unchanged)"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return data
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if max(image.size) <= max_px:
+                return data
+            image.thumbnail((max_px, max_px), Image.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG", optimize=True)
+    except Exception as e:
+        print(f"⚠️  Could not downscale logo: {e}")
+        return data
+    return buffer.getvalue() if buffer.tell() < len(data) else data
+
+@functools.lru_cache(maxsize=None)
+def asset_data_uri(name):
+    """Cached data: URI for a logo, for HTML that has to work on its own"""
+    data = get_asset(name)
+    if data is None:
+        return name
+    return "data:image/png;base64," + base64.b64encode(data).decode("ascii")
+
+# --- Slide templates ---
+# Slides are rendered from small mustache-style templates that are parsed once,
+# when they are registered:
+#   {{field}}                    the field, HTML-escaped
+#   {{#field}}...{{/field}}      the block once per item of a list field, or once
+#                                if a text field is non-empty ({{.}} is the item)
+# and compiled into a plain Python function, so rendering costs about the same
+# as the f-strings it replaced.
+# Adding a slide type means registering its template (and record class) rather
+# than editing create_slide_html.
+HTML_ESCAPES = {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#x27;"}
+HTML_SPECIAL_RE = re.compile(r"[&<>\"']")
+TEMPLATE_TAG_RE = re.compile(r"{{\s*([#/]?)\s*([\w.]+)\s*}}")
+
+class TemplateError(ValueError):
+    pass
+
+def _escape_match(match):
+    return HTML_ESCAPES[match.group()]
+
+def escape_html(value):
+    """Escape text for HTML content and attributes in a single pass"""
+    text = value if isinstance(value, str) else "" if value is None else str(value)
+    return HTML_SPECIAL_RE.sub(_escape_match, text)
+
+def _template_items(value):
+    return value if isinstance(value, (list, tuple)) else (value,) if value else ()
+
+class SlideTemplate:
+    """A template compiled once into a Python function of a slide record (fields are read as attributes)"""
+    __slots__ = ("source", "render")
+
+    def __init__(self, source):
+        self.source = source
+        code = f"def render(slide):\n    return {self._compile(self._parse(source), 'slide', 0)}\n"
+        namespace = {"_items": _template_items, "_escape": escape_html}
+        exec(compile(code, "<slide template>", "exec"), namespace)
+        self.render = namespace["render"]
+
+    @staticmethod
+    def _parse(source):
+        """Nested nodes: literal strings, ("var", name) and ("section", name, nodes)"""
+        root = []
+        stack = [(None, root)]
+        pos = 0
+        for match in TEMPLATE_TAG_RE.finditer(source):
+            if match.start() > pos:
+                stack[-1][1].append(source[pos:match.start()])
+            pos = match.end()
+            kind, name = match.groups()
+            if kind == "#":
+                children = []
+                stack[-1][1].append(("section", name, children))
+                stack.append((name, children))
+            elif kind == "/":
+                if stack[-1][0] != name:
+                    raise TemplateError(f"Unexpected {{{{/{name}}}}} in slide template")
+                stack.pop()
+            else:
+                stack[-1][1].append(("var", name))
+        if len(stack) > 1:
+            raise TemplateError(f"Unclosed {{{{#{stack[-1][0]}}}}} in slide template")
+        if pos < len(source):
+            root.append(source[pos:])
+        return root
+
+    @classmethod
+    def _compile(cls, nodes, item, depth):
+        """Python expression for nodes; item is the variable {{.}} refers to"""
+        parts = []
+        for node in nodes:
+            if isinstance(node, str):
+                parts.append(repr(node))
+                continue
+            value = item if node[1] == "." else f"slide.{node[1]}"
+            if node[0] == "var":
+                parts.append(f"_escape({value})")
+            else:
+                inner = f"_item{depth}"
+                parts.append(f"''.join([{cls._compile(node[2], inner, depth + 1)} for {inner} in _items({value})])")
+        return " + ".join(parts) or "''"
+
+SLIDE_TEMPLATES = {}
+
+def register_slide_template(slide_types, template, slide_class=None):
+    """Compile template and use it for slide_types; slide_class also registers a new record type"""
+    if isinstance(slide_types, str):
+        slide_types = [slide_types]
+    compiled = template if isinstance(template, SlideTemplate) else SlideTemplate(template)
+    for slide_type in slide_types:
+        SLIDE_TEMPLATES[slide_type] = compiled
+        if slide_class is not None:
+            SLIDE_TYPES[slide_type] = slide_class
+    return compiled
+
+register_slide_template("title", """
         <section class="slide title-slide">
             <div class="logo logo-white"></div>
             <div class="slide-content">
-                <h1>{slide["title"]}</h1>
-                <h2>{slide["subtitle"]}</h2>
-                <div class="highlight">{slide["highlight"]}</div>
+                <h1>{{title}}</h1>
+                <h2>{{subtitle}}</h2>
+                <div class="highlight">{{highlight}}</div>
             </div>
         </section>
-        """
-    
-    elif slide["type"] == "stat":
-        stats_html = "".join([f"<div class='stat-item'>{stat}</div>" for stat in slide["stats"]])
-        return f"""
+        """)
+
+register_slide_template("stat", """
         <section class="slide stat-slide">
             <div class="logo logo-normal"></div>
             <div class="slide-content">
-                <h2>{slide["title"]}</h2>
-                <div class="stats-grid">{stats_html}</div>
-                <p class="subtitle">{slide["subtitle"]}</p>
+                <h2>{{title}}</h2>
+                <div class="stats-grid">{{#stats}}<div class='stat-item'>{{.}}</div>{{/stats}}</div>
+                <p class="subtitle">{{subtitle}}</p>
             </div>
         </section>
-        """
-    
-    elif slide["type"] in ["platforms", "comparison", "tools", "trends", "capabilities", "list"]:
-        items_html = "".join([f"<div class='item'>{item}</div>" for item in slide["items"]])
-        subtitle_html = f"<p class='subtitle'>{slide['subtitle']}</p>" if "subtitle" in slide else ""
-        description_html = f"<p class='description'>{slide['description']}</p>" if "description" in slide else ""
-        return f"""
+        """)
+
+register_slide_template(["platforms", "comparison", "tools", "trends", "capabilities", "list"], """
         <section class="slide list-slide">
             <div class="logo logo-normal"></div>
             <div class="slide-content">
-                <h2>{slide["title"]}</h2>
-                {subtitle_html}
-                {description_html}
-                <div class="items-list">{items_html}</div>
+                <h2>{{title}}</h2>
+                {{#subtitle}}<p class='subtitle'>{{subtitle}}</p>{{/subtitle}}
+                {{#description}}<p class='description'>{{description}}</p>{{/description}}
+                <div class="items-list">{{#items}}<div class='item'>{{.}}</div>{{/items}}</div>
             </div>
         </section>
-        """
-    
-    elif slide["type"] == "results":
-        cases_html = "".join([f"<div class='case'>{case}</div>" for case in slide["cases"]])
-        subtitle_html = f"<p class='subtitle'>{slide['subtitle']}</p>" if "subtitle" in slide else ""
-        description_html = f"<p class='description'>{slide['description']}</p>" if "description" in slide else ""
-        return f"""
+        """)
+
+register_slide_template("results", """
         <section class="slide results-slide">
             <div class="logo logo-dark"></div>
             <div class="slide-content">
-                <h2>{slide["title"]}</h2>
-                {subtitle_html}
-                {description_html}
-                <div class="cases-grid">{cases_html}</div>
+                <h2>{{title}}</h2>
+                {{#subtitle}}<p class='subtitle'>{{subtitle}}</p>{{/subtitle}}
+                {{#description}}<p class='description'>{{description}}</p>{{/description}}
+                <div class="cases-grid">{{#cases}}<div class='case'>{{.}}</div>{{/cases}}</div>
             </div>
         </section>
-        """
-    
-    elif slide["type"] == "recommendations":
-        sections_html = "".join([f"<div class='rec'>{section}</div>" for section in slide["sections"]])
-        subtitle_html = f"<p class='subtitle'>{slide['subtitle']}</p>" if "subtitle" in slide else ""
-        description_html = f"<p class='description'>{slide['description']}</p>" if "description" in slide else ""
-        return f"""
+        """)
+
+register_slide_template("recommendations", """
         <section class="slide recommendations-slide">
             <div class="logo logo-white"></div>
             <div class="slide-content">
-                <h2>{slide["title"]}</h2>
-                {subtitle_html}
-                {description_html}
-                <div class="recommendations-grid">{sections_html}</div>
+                <h2>{{title}}</h2>
+                {{#subtitle}}<p class='subtitle'>{{subtitle}}</p>{{/subtitle}}
+                {{#description}}<p class='description'>{{description}}</p>{{/description}}
+                <div class="recommendations-grid">{{#sections}}<div class='rec'>{{.}}</div>{{/sections}}</div>
             </div>
         </section>
-        """
-    
-    elif slide["type"] == "cta":
-        steps_html = "".join([f"<div class='step'>{step}</div>" for step in slide["steps"]])
-        description_html = f"<p class='description'>{slide['description']}</p>" if "description" in slide else ""
-        return f"""
+        """)
+
+register_slide_template("cta", """
         <section class="slide cta-slide">
             <div class="logo logo-white"></div>
             <div class="slide-content">
-                <h2>{slide["title"]}</h2>
-                <h3>{slide["subtitle"]}</h3>
-                {description_html}
-                <div class="steps">{steps_html}</div>
-                <div class="highlight">{slide["highlight"]}</div>
+                <h2>{{title}}</h2>
+                <h3>{{subtitle}}</h3>
+                {{#description}}<p class='description'>{{description}}</p>{{/description}}
+                <div class="steps">{{#steps}}<div class='step'>{{.}}</div>{{/steps}}</div>
+                <div class="highlight">{{highlight}}</div>
             </div>
         </section>
-        """
-    
-    elif slide["type"] == "final":
-        return f"""
+        """)
+
+register_slide_template("final", """
         <section class="slide final-slide">
             <div class="logo-center"></div>
-            <h2>{slide["title"]}</h2>
-            <h3>{slide["subtitle"]}</h3>
-            <p class="description">{slide["description"]}</p>
-            <a href="https://www.projectworklab.com" target="_blank" class="cta-button">{slide["cta_text"]}</a>
+            <h2>{{title}}</h2>
+            <h3>{{subtitle}}</h3>
+            <p class="description">{{description}}</p>
+            <a href="https://www.projectworklab.com" target="_blank" class="cta-button">{{cta_text}}</a>
             <p style="font-size: 16px; margin-top: 30px; opacity: 0.7;">ProjectWorkLab.com</p>
         </section>
-        """
+        """)
 
-def generate_html_from_slides(slides_content):
-    """Generate complete HTML from slides"""
-    # Generar todas las slides
-    slides_html = "".join([create_slide_html(slide) for slide in slides_content])
+# --- Generate professional HTML ---
+def create_slide_html(slide):
+    slide = slide_from_dict(slide)  # Validated record: every field of its type exists
+    template = SLIDE_TEMPLATES.get(slide.type)
+    if template is None:
+        raise TemplateError(f"No template registered for slide type {slide.type!r}")
+    return template.render(slide)
 
-    # --- HTML final con diseño profesional ---
-    final_html = """
+# --- Page shell ---
+# The head (with the full stylesheet) and the tail are built once per process;
+# pages only add their slides in between.
+CAROUSEL_PAGE_HEAD = """
 <!DOCTYPE html>
 <html>
 <head>
@@ -788,226 +2757,1355 @@ def generate_html_from_slides(slides_content):
   </style>
 </head>
 <body>
-""" + slides_html + """
+"""
+
+CAROUSEL_PAGE_TAIL = """
 </body>
 </html>
 """
-    return final_html
+
+@functools.lru_cache(maxsize=None)
+def carousel_page_head(inline_assets=False):
+    """Document head and stylesheet, with the logos embedded as data URIs if asked"""
+    head = CAROUSEL_PAGE_HEAD
+    if inline_assets:
+        for name in LOGO_DISPLAY_PX:
+            head = head.replace(f"url('{name}')", f"url('{asset_data_uri(name)}')")
+    return head
+
+def iter_carousel_html(slides_content, inline_assets=False):
+    """Yield the page as chunks: the head, one chunk per slide, then the tail
+
+    slides_content can be a generator; each slide is rendered only when its
+    chunk is requested.
+    """
+    yield carousel_page_head(inline_assets)
+    for slide in slides_content:
+        yield create_slide_html(slide)
+    yield CAROUSEL_PAGE_TAIL
+
+def write_carousel_html(slides_content, fp, inline_assets=False):
+    """Stream the page into fp chunk by chunk; binary writables (zip entries, socket files) get UTF-8"""
+    binary = isinstance(fp, (io.RawIOBase, io.BufferedIOBase)) or "b" in getattr(fp, "mode", "")
+    for chunk in iter_carousel_html(slides_content, inline_assets):
+        fp.write(chunk.encode("utf-8") if binary else chunk)
+
+def generate_html_from_slides(slides_content, inline_assets=False):
+    """Generate complete HTML from slides
+
+    With ``inline_assets`` the logos are embedded as data URIs so the file
+    renders correctly wherever it is saved.
+    """
+    return "".join(iter_carousel_html(slides_content, inline_assets))
 
 def save_and_generate_files(slides_content, output_html, output_pdf):
     """Save HTML and generate PDF files"""
-    # Generate HTML
-    final_html = generate_html_from_slides(slides_content)
-    
     # --- Save and export PDF ---
     with open(output_html, "w", encoding="utf-8") as f:
-        f.write(final_html)
+        write_carousel_html(slides_content, f)
     
     # Generate PDF
     success = generate_pdf_from_html(output_html, output_pdf)
     return success
 
-def generate_pdf_from_html(html_path, pdf_path):
-    """Generate PDF from HTML file using Playwright"""
+# --- Warm Chromium pool ---
+# Every PDF render leases a page from one long-lived pool instead of launching
+# (and tearing down) its own browser. The pool lives on a dedicated event loop
+# thread because Playwright objects are bound to the loop that created them.
+BROWSER_LAUNCH_ARGS = ['--no-sandbox', '--disable-setuid-sandbox', '--disable-dev-shm-usage']
+BROWSER_POOL_SIZE = int(os.getenv('CAROUSEL_BROWSER_POOL_SIZE', '1'))
+BROWSER_MAX_JOBS = int(os.getenv('CAROUSEL_BROWSER_MAX_JOBS', '50'))
+BROWSER_MAX_CONTEXTS = int(os.getenv('CAROUSEL_BROWSER_MAX_CONTEXTS', '4'))  # Pages one browser renders at once
+BROWSER_MAX_MEMORY_MB = int(os.getenv('CAROUSEL_BROWSER_MAX_MEMORY_MB', '700'))
+BROWSER_HEALTH_CHECK_INTERVAL = 30  # seconds a browser may sit idle before it is probed
+BROWSER_HEALTH_CHECK_TIMEOUT = 5
+PDF_RENDER_TIMEOUT = 60
+RENDER_OPTIONS = {"width": 1080, "height": 1080, "device_scale_factor": ASSET_SCALE, "version": 2}
+ASSET_BASE_URL = "http://carousel.assets/"  # Synthetic origin, every request to it is answered from memory
+
+def _is_chromium(proc):
+    name = proc.name().lower()
+    return "chrom" in name or "headless_shell" in name
+
+def _chromium_browser_pids():
+    """PIDs of the browsers launched by this process's own Playwright driver (None without psutil).
+
+    Browsers are direct children of the driver, which is a direct child of this
+    process; browsers of fallback render workers sit one level deeper and are not included.
+    """
+    try:
+        import psutil
+    except ImportError:
+        return None
+    pids = set()
+    try:
+        for driver in psutil.Process().children():
+            try:
+                pids.update(proc.pid for proc in driver.children() if _is_chromium(proc))
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+    except psutil.Error:
+        return None
+    return pids
+
+def _browser_memory_mb(pid):
+    """Resident memory of one browser and its renderer/GPU processes (None if unknown)"""
+    if pid is None:
+        return None
     try:
-        import asyncio
-        import sys
-        import threading
+        import psutil
+    except ImportError:
+        return None
+    try:
+        browser = psutil.Process(pid)
+        total = browser.memory_info().rss
+        for proc in browser.children(recursive=True):
+            try:
+                total += proc.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+    except psutil.Error:
+        return None
+    return total / (1024 * 1024)
+
+class _PooledBrowser:
+    """One Chromium instance owned by the pool, handed out as a lease"""
+
+    def __init__(self, pool, index):
+        self.pool = pool
+        self.index = index
+        self.browser = None
+        self.pid = None  # Browser process, for its memory check
+        self.jobs = 0
+        self.users = 0  # Leases currently holding this browser
+        self.exclusive = False
+        self.starting = False  # First lease is probing or launching the browser
+        self.draining = False  # Due for recycling: no new leases, retired once the last one ends
+        self.retiring = False
+        self.last_used = 0.0
+        self.closing = False
+
+    @contextlib.asynccontextmanager
+    async def page(self):
+        """Open a fresh 1080x1080 page in its own browser context"""
+        context = await self.browser.new_context(
+            viewport={'width': RENDER_OPTIONS["width"], 'height': RENDER_OPTIONS["height"]},
+            device_scale_factor=RENDER_OPTIONS["device_scale_factor"]  # Higher DPI for better quality
+        )
+        try:
+            await context.route(f"{ASSET_BASE_URL}**", _serve_asset)
+            yield await context.new_page()
+        finally:
+            self.jobs += 1
+            self.pool.stats["jobs"] += 1
+            try:
+                await context.close()
+            except Exception:
+                pass
+
+class BrowserPool:
+    """Long-lived pool of warm Chromium browsers.
+
+    Browsers are launched lazily and shared: each one serves up to
+    ``max_contexts`` pages at once, every page in its own browser context.
+    They are probed when they have been idle for a while, recycled after
+    ``max_jobs`` renders or when Chromium grows past ``max_memory_mb`` (once
+    their in-flight pages finish) and relaunched automatically if they crash.
+    """
+
+    def __init__(self, size=BROWSER_POOL_SIZE, max_jobs=BROWSER_MAX_JOBS, max_memory_mb=BROWSER_MAX_MEMORY_MB,
+                 max_contexts=BROWSER_MAX_CONTEXTS):
+        self.size = max(1, size)
+        self.max_jobs = max_jobs
+        self.max_memory_mb = max_memory_mb
+        self.max_contexts = max(1, max_contexts)
+        self.stats = {"launches": 0, "recycles": 0, "crashes": 0, "jobs": 0}
+        self._playwright = None
+        self._slots = []
+        self._available = None
+        self._start_task = None
+        self._launch_lock = None
+
+    async def _ensure_started(self):
+        if self._start_task is None:
+            self._start_task = asyncio.ensure_future(self._start())
+        await asyncio.shield(self._start_task)
+
+    async def _start(self):
+        from playwright.async_api import async_playwright
+        self._playwright = await async_playwright().start()
+        self._available = asyncio.Condition()
+        self._slots = [_PooledBrowser(self, i) for i in range(self.size)]
+
+    async def _launch(self, slot):
+        if self._launch_lock is None:
+            self._launch_lock = asyncio.Lock()
+        # One launch at a time, so the browser process that appears belongs to this slot
+        async with self._launch_lock:
+            before = _chromium_browser_pids()
+            browser = await self._playwright.chromium.launch(args=BROWSER_LAUNCH_ARGS)
+            after = _chromium_browser_pids()
+        new_pids = (after - before - {s.pid for s in self._slots}) if before is not None and after is not None else set()
+        slot.pid = new_pids.pop() if len(new_pids) == 1 else None
+        browser.on("disconnected", lambda _: self._on_disconnected(slot, browser))
+        slot.browser = browser
+        slot.jobs = 0
+        slot.closing = False
+        slot.last_used = time.monotonic()
+        self.stats["launches"] += 1
+
+    def _on_disconnected(self, slot, browser):
+        if slot.browser is browser and not slot.closing:
+            print(f"⚠️  Pooled browser {slot.index} crashed, it will be relaunched on next use")
+            self.stats["crashes"] += 1
+            slot.browser = None
+
+    async def _retire(self, slot):
+        browser, slot.browser = slot.browser, None
+        slot.pid = None
+        if browser is None:
+            return
+        slot.closing = True
+        try:
+            await browser.close()
+        except Exception:
+            pass
+
+    async def _is_healthy(self, slot):
+        if slot.browser is None or not slot.browser.is_connected():
+            return False
+        if time.monotonic() - slot.last_used < BROWSER_HEALTH_CHECK_INTERVAL:
+            return True
+        try:
+            context = await asyncio.wait_for(slot.browser.new_context(), BROWSER_HEALTH_CHECK_TIMEOUT)
+            await context.close()
+            return True
+        except Exception:
+            return False
+
+    def _pick(self, exclusive):
+        """Slot for a new lease, or None while every browser is busy"""
+        ready = [s for s in self._slots if not s.starting and not s.retiring]
+        if not exclusive:
+            # Join the least busy running browser before launching another one
+            shared = [s for s in ready if s.users and not s.exclusive and not s.draining
+                      and s.users < self.max_contexts and s.browser is not None]
+            if shared:
+                return min(shared, key=lambda s: s.users)
+        free = [s for s in ready if not s.users]
+        if free:
+            # Prefer a browser that is already running over a cold slot
+            return next((s for s in free if s.browser is not None), free[0])
+        return None
+
+    async def _acquire(self, exclusive=False):
+        await self._ensure_started()
+        async with self._available:
+            while True:
+                slot = self._pick(exclusive)
+                if slot is not None:
+                    break
+                await self._available.wait()
+            slot.users += 1
+            if slot.users > 1:
+                return slot
+            slot.exclusive = exclusive
+            slot.starting = True
+        try:
+            if not await self._is_healthy(slot):
+                await self._retire(slot)
+                await self._launch(slot)
+        except BaseException:
+            slot.starting = False
+            await self._release(slot, failed=True)
+            raise
+        async with self._available:
+            slot.starting = False
+            self._available.notify_all()
+        return slot
+
+    async def _release(self, slot, failed=False):
+        slot.last_used = time.monotonic()
+        if failed or slot.jobs >= self.max_jobs:
+            slot.draining = True
+        elif self.max_memory_mb and not slot.draining:
+            memory_mb = _browser_memory_mb(slot.pid)
+            slot.draining = memory_mb is not None and memory_mb > self.max_memory_mb
+        async with self._available:
+            slot.users -= 1
+            slot.retiring = not slot.users and slot.draining
+            if not slot.users and not slot.retiring:
+                slot.exclusive = False
+            self._available.notify_all()
+        if not slot.retiring:
+            return
+        # The last lease of a draining browser closes it; the next lease launches a fresh one
+        if slot.browser is not None:
+            self.stats["recycles"] += 1
+            await self._retire(slot)
+        async with self._available:
+            slot.retiring = slot.draining = slot.exclusive = False
+            self._available.notify_all()
+
+    @contextlib.asynccontextmanager
+    async def _lease(self, exclusive):
+        slot = await self._acquire(exclusive)
+        failed = False
+        try:
+            yield slot
+        except BaseException:
+            failed = slot.browser is None or not slot.browser.is_connected()
+            raise
+        finally:
+            await self._release(slot, failed=failed)
+
+    def browser(self):
+        """Lease a warm browser exclusively; open isolated pages with ``lease.page()``"""
+        return self._lease(exclusive=True)
+
+    @contextlib.asynccontextmanager
+    async def page(self):
+        """Lease a fresh page in an isolated context of a shared pooled browser"""
+        async with self._lease(exclusive=False) as lease:
+            async with lease.page() as page:
+                yield page
+
+    async def close(self):
+        for slot in self._slots:
+            await self._retire(slot)
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+        self._start_task = None
+
+# --- Render service ---
+class RenderService:
+    """Owns the background event-loop thread that every PDF render runs on.
+
+    Callers never create or replace event loops: ``submit()`` is thread-safe and
+    returns a ``concurrent.futures.Future``, and ``await render()`` works from any
+    event loop. Each job has its own timeout and cancelling the future (or the
+    awaiting task) cancels the render and releases its browser context.
+    """
+
+    def __init__(self, pool=None):
+        self.pool = pool or BrowserPool()
+        self._loop = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.ProactorEventLoop() if sys.platform == "win32" else asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="carousel-render-loop", daemon=True).start()
+                self._loop = loop
+        return self._loop
+
+    def run_coroutine(self, coro):
+        """Schedule a coroutine on the render loop and return a thread-safe Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call(self, coro, timeout=None):
+        """Run a coroutine on the render loop and block until it finishes"""
+        future = self.run_coroutine(coro)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def submit(self, html, output_pdf=None, timeout=PDF_RENDER_TIMEOUT):
+        """Queue a render from any thread; the Future resolves to the PDF bytes"""
+        return self.run_coroutine(self._render_job(html, output_pdf, timeout))
+
+    async def render(self, html, output_pdf=None, timeout=PDF_RENDER_TIMEOUT):
+        """Render carousel markup to PDF bytes; awaitable from any event loop"""
+        future = self.submit(html, output_pdf, timeout)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+    async def _render_job(self, html, output_pdf, timeout):
+        # The timeout starts once a browser is leased: waiting for a busy pool is not a render failure
+        async with self.pool.page() as page:
+            return await asyncio.wait_for(self._render(page, html, output_pdf), timeout)
+
+    async def _render(self, page, html, output_pdf):
+        await _load_html(page, html)
+        pdf_bytes, _ = await _print_page_to_pdf(page, output_pdf)
+        return pdf_bytes
+
+    def shutdown(self, timeout=10):
+        """Close pooled browsers and stop the loop thread"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.pool.close(), loop).result(timeout)
+        except Exception:
+            pass
+        loop.call_soon_threadsafe(loop.stop)
+
+_render_service = None
+_render_lock = threading.Lock()
+
+def get_render_service():
+    """Process-wide render service shared by the CLI, Streamlit and batch renders"""
+    global _render_service
+    with _render_lock:
+        if _render_service is None:
+            _render_service = RenderService()
+    return _render_service
+
+def get_browser_pool():
+    """Browser pool owned by the process-wide render service"""
+    return get_render_service().pool
+
+@atexit.register
+def shutdown_render_service():
+    """Close pooled browsers and stop the render loop at interpreter exit"""
+    if _render_service is not None:
+        _render_service.shutdown()
+
+# --- Render readiness ---
+# The carousel is fully local, so instead of sleeping a fixed 3 s we wait for the
+# things that actually affect the printout: web fonts, every logo/background
+# image being decoded and the layout settling. The whole wait is bounded by
+# RENDER_READY_TIMEOUT_MS and every phase is timed.
+RENDER_READY_TIMEOUT_MS = int(os.getenv('CAROUSEL_RENDER_READY_TIMEOUT_MS', '5000'))
+RENDER_READY_TIMINGS = collections.deque(maxlen=200)
+
+RENDER_READY_SCRIPT = """
+async (timeoutMs) => {
+    const started = performance.now();
+    const timings = {fonts_ms: 0, images_ms: 0, layout_ms: 0, images: 0, timed_out: false};
+    let expired = false;
+    const deadline = new Promise(resolve => setTimeout(() => { expired = true; resolve(); }, timeoutMs));
+    const phase = async (name, work) => {
+        const t = performance.now();
+        await Promise.race([work().catch(() => {}), deadline]);
+        timings[name] = Math.round(performance.now() - t);
+    };
+
+    await phase('fonts_ms', () => document.fonts.ready);
+
+    await phase('images_ms', () => {
+        const urls = new Set();
+        const decodes = [];
+        document.querySelectorAll('img').forEach(img => decodes.push(img.decode()));
+        document.querySelectorAll('*').forEach(el => {
+            const bg = getComputedStyle(el).backgroundImage;
+            for (const match of bg.matchAll(/url\\(["']?([^"')]+)["']?\\)/g)) {
+                urls.add(match[1]);
+            }
+        });
+        urls.forEach(src => {
+            const img = new Image();
+            img.src = src;
+            decodes.push(img.decode());
+        });
+        timings.images = decodes.length;
+        return Promise.allSettled(decodes);
+    });
+
+    await phase('layout_ms', () => new Promise(resolve => {
+        // Layout is stable once two consecutive frames report the same geometry
+        let previous = null;
+        const check = () => {
+            if (expired) return resolve();
+            const slides = document.querySelectorAll('.slide');
+            const signature = document.documentElement.scrollHeight + ':' + slides.length + ':' +
+                Array.from(slides, s => s.scrollHeight).join(',');
+            if (signature === previous) return resolve();
+            previous = signature;
+            requestAnimationFrame(check);
+        };
+        requestAnimationFrame(check);
+    }));
+
+    timings.timed_out = expired;
+    timings.total_ms = Math.round(performance.now() - started);
+    return timings;
+}
+"""
+
+async def _wait_for_render_ready(page, timeout_ms=RENDER_READY_TIMEOUT_MS):
+    """Wait until fonts, images and layout are ready (bounded) and record the timings"""
+    timings = await page.evaluate(RENDER_READY_SCRIPT, timeout_ms)
+    RENDER_READY_TIMINGS.append(timings)
+    if timings.get("timed_out"):
+        print(f"⚠️  Render readiness hit the {timeout_ms} ms limit: {timings}")
+    return timings
+
+def render_ready_summary():
+    """Average readiness timings over the recent renders"""
+    samples = list(RENDER_READY_TIMINGS)
+    if not samples:
+        return {"renders": 0}
+    summary = {"renders": len(samples), "timeouts": sum(1 for s in samples if s.get("timed_out"))}
+    for key in ("fonts_ms", "images_ms", "layout_ms", "total_ms"):
+        summary[f"avg_{key}"] = round(sum(s.get(key, 0) for s in samples) / len(samples), 1)
+    return summary
+
+# --- PDF render cache ---
+# Identical carousels (e.g. every Streamlit rerun of the same slides) are served
+# from a content-addressed cache instead of being re-rendered by Chromium.
+# Entries are keyed by the final HTML, the logo assets and the render options.
+RENDER_CACHE_DIR = os.getenv('CAROUSEL_RENDER_CACHE_DIR', os.path.join("temp", "pdf_cache"))
+RENDER_CACHE_MEMORY_MB = int(os.getenv('CAROUSEL_RENDER_CACHE_MEMORY_MB', '64'))
+RENDER_CACHE_DISK_MB = int(os.getenv('CAROUSEL_RENDER_CACHE_DISK_MB', '256'))
+RENDER_CACHE_TTL = int(os.getenv('CAROUSEL_RENDER_CACHE_TTL', str(7 * 24 * 3600)))
+
+class DiskCache:
+    """Directory of content-addressed entries with a byte cap, TTL and LRU eviction.
+
+    An entry's mtime doubles as its last-access time, so reads touch the file
+    and eviction removes the least recently used entries first.
+    """
+
+    def __init__(self, directory, max_bytes, ttl_seconds=None, suffix=".bin"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.suffix = suffix
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "writes": 0}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}{self.suffix}")
+
+    def _expired(self, mtime, now=None):
+        return self.ttl_seconds is not None and (now or time.time()) - mtime > self.ttl_seconds
+
+    def get(self, key, record=True):
+        """Entry bytes or None; record=False peeks without touching the entry or counting a hit/miss"""
+        path = self._path(key)
+        with self._lock:
+            try:
+                if self._expired(os.path.getmtime(path)):
+                    os.remove(path)
+                    self.stats["evictions"] += 1
+                    if record:
+                        self.stats["misses"] += 1
+                    return None
+                with open(path, "rb") as f:
+                    data = f.read()
+                if record:
+                    os.utime(path)
+            except OSError:
+                if record:
+                    self.stats["misses"] += 1
+                return None
+            if record:
+                self.stats["hits"] += 1
+            return data
+
+    def set(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with self._lock:
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                self.stats["writes"] += 1
+            except OSError as e:
+                print(f"⚠️  Could not write cache entry {path}: {e}")
+                return
+            self._evict()
+
+    def _evict(self):
+        now = time.time()
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(self.suffix):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            if self._expired(stat.st_mtime, now):
+                self._remove(entry.path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            self.stats["evictions"] += 1
+        except OSError:
+            pass
+
+    def clear(self):
+        with self._lock:
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(self.suffix):
+                    self._remove(entry.path)
+
+    def size_bytes(self):
+        return sum(e.stat().st_size for e in os.scandir(self.directory) if e.name.endswith(self.suffix))
+
+class RenderCache:
+    """Two-tier (memory LRU + disk) cache of rendered PDFs"""
+
+    def __init__(self, directory=RENDER_CACHE_DIR, memory_bytes=RENDER_CACHE_MEMORY_MB * 1024 * 1024,
+                 disk_bytes=RENDER_CACHE_DISK_MB * 1024 * 1024, ttl_seconds=RENDER_CACHE_TTL):
+        self.memory_bytes = memory_bytes
+        self.disk = DiskCache(directory, disk_bytes, ttl_seconds, suffix=".pdf")
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "memory_evictions": 0}
+        self._memory = collections.OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(html, options=None):
+        digest = hashlib.sha256()
+        digest.update(html.encode("utf-8"))
+        digest.update(json.dumps(_asset_fingerprints(), sort_keys=True).encode())
+        digest.update(json.dumps(options or RENDER_OPTIONS, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return data
+        data = self.disk.get(key)
+        if data is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["disk_hits"] += 1
+        self._remember(key, data)
+        return data
+
+    def set(self, key, data):
+        self._remember(key, data)
+        self.disk.set(key, data)
+
+    def _remember(self, key, data):
+        if len(data) > self.memory_bytes:
+            return
+        with self._lock:
+            if key in self._memory:
+                self._memory_size -= len(self._memory.pop(key))
+            self._memory[key] = data
+            self._memory_size += len(data)
+            while self._memory_size > self.memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_size -= len(evicted)
+                self.stats["memory_evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+        self.disk.clear()
+
+    def summary(self):
+        lookups = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["misses"]
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        return {
+            **self.stats,
+            "disk_evictions": self.disk.stats["evictions"],
+            "hit_rate": round(hits / lookups, 3) if lookups else None,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_size,
+        }
+
+def _asset_fingerprints():
+    """Size and modification time of the logo files the carousel CSS references"""
+    fingerprints = {"display_px": LOGO_DISPLAY_PX}
+    for name in LOGO_DISPLAY_PX:
+        try:
+            stat = os.stat(os.path.join(APP_DIR, name))
+            fingerprints[name] = [stat.st_size, stat.st_mtime_ns]
+        except OSError:
+            fingerprints[name] = None
+    return fingerprints
+
+_render_cache = None
+
+def get_render_cache():
+    """Process-wide PDF render cache"""
+    global _render_cache
+    with _render_lock:
+        if _render_cache is None:
+            _render_cache = RenderCache()
+    return _render_cache
+
+# --- Render job queue ---
+# Admission control for interactive callers (the Streamlit app): at most
+# RENDER_QUEUE_CONCURRENCY renders run at once, at most RENDER_QUEUE_MAX_DEPTH
+# wait behind them and anything beyond that is rejected immediately instead of
+# piling up Chromium work and memory.
+RENDER_QUEUE_CONCURRENCY = int(os.getenv('CAROUSEL_RENDER_CONCURRENCY', str(BROWSER_POOL_SIZE)))
+RENDER_QUEUE_MAX_DEPTH = int(os.getenv('CAROUSEL_RENDER_QUEUE_DEPTH', '8'))
+RENDER_QUEUE_INITIAL_ESTIMATE = 5.0  # seconds per render until real timings exist
+
+class RenderQueueFull(RuntimeError):
+    """The render queue is at its maximum depth; try again later"""
+
+class RenderTicket:
+    """Handle for a queued render: poll position()/eta_seconds(), then result()"""
+
+    def __init__(self, queue_):
+        self._queue = queue_
+        self.future = None
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+
+    def position(self):
+        """Place in the waiting line (1 = next up), 0 once it is rendering or done"""
+        return self._queue._position(self)
+
+    def eta_seconds(self):
+        """Rough seconds until the PDF is ready, from recent render durations"""
+        return self._queue._eta(self)
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+    def cancel(self):
+        return self.future.cancel()
+
+class RenderQueue:
+    """Process-wide bounded queue in front of the render service"""
+
+    def __init__(self, concurrency=RENDER_QUEUE_CONCURRENCY, max_depth=RENDER_QUEUE_MAX_DEPTH, service=None):
+        self.concurrency = max(1, concurrency)
+        self.max_depth = max(0, max_depth)
+        self.service = service
+        self.stats = {"submitted": 0, "rejected": 0, "completed": 0, "failed": 0, "cache_hits": 0}
+        self._waiting = []
+        self._running = 0
+        self._avg_seconds = RENDER_QUEUE_INITIAL_ESTIMATE
+        self._slots = None
+        self._lock = threading.Lock()
+
+    def submit(self, html, use_cache=True, timeout=PDF_RENDER_TIMEOUT):
+        """Queue a render or raise RenderQueueFull right away when the queue is full"""
+        cache = get_render_cache() if use_cache else None
+        key = cache.key(html) if cache is not None else None
+        ticket = RenderTicket(self)
         
-        # Try different approaches for Windows compatibility
-        if sys.platform == "win32":
-            # Method 1: Use thread with new event loop
-            result = [False]
-            exception = [None]
-            
-            def run_in_thread():
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                ticket.future = concurrent.futures.Future()
+                ticket.future.set_result(cached)
+                self.stats["cache_hits"] += 1
+                return ticket
+        
+        with self._lock:
+            if len(self._waiting) + self._running >= self.concurrency + self.max_depth:
+                self.stats["rejected"] += 1
+                raise RenderQueueFull(
+                    f"{self._running} renders running and {len(self._waiting)} waiting; try again shortly"
+                )
+            self._waiting.append(ticket)
+            self.stats["submitted"] += 1
+        
+        service = self.service or get_render_service()
+        ticket.future = service.run_coroutine(self._run(service, ticket, html, cache, key, timeout))
+        ticket.future.add_done_callback(lambda _: self._forget(ticket))
+        return ticket
+
+    async def _run(self, service, ticket, html, cache, key, timeout):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        async with self._slots:
+            with self._lock:
+                self._waiting.remove(ticket)
+                self._running += 1
+            ticket.started_at = time.monotonic()
+            try:
                 try:
-                    # Create completely isolated event loop
-                    asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    try:
-                        result[0] = loop.run_until_complete(_generate_pdf_async(html_path, pdf_path))
-                    finally:
-                        loop.close()
+                    pdf_bytes = await service._render_job(html, None, timeout)
+                except asyncio.CancelledError:
+                    raise
                 except Exception as e:
-                    exception[0] = e
-            
-            thread = threading.Thread(target=run_in_thread)
-            thread.start()
-            thread.join(timeout=60)  # 60 second timeout
-            
-            if exception[0]:
-                raise exception[0]
-            
-            return result[0]
-        else:
-            # Linux/Mac - use direct async approach
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                return loop.run_until_complete(_generate_pdf_async(html_path, pdf_path))
+                    print(f"Error generating PDF: {e}")
+                    print("   Retrying in a fallback render worker...")
+                    loop = asyncio.get_running_loop()
+                    pdf_bytes = await loop.run_in_executor(None, get_render_worker_pool().render, html)
+            except BaseException:
+                self.stats["failed"] += 1
+                raise
             finally:
-                loop.close()
-            
+                elapsed = time.monotonic() - ticket.started_at
+                with self._lock:
+                    self._running -= 1
+                    self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * elapsed
+            self.stats["completed"] += 1
+            if cache is not None:
+                cache.set(key, pdf_bytes)
+            return pdf_bytes
+
+    def _forget(self, ticket):
+        # Tickets cancelled before they started never reach _run's bookkeeping
+        with self._lock:
+            if ticket in self._waiting:
+                self._waiting.remove(ticket)
+
+    def _position(self, ticket):
+        with self._lock:
+            try:
+                return self._waiting.index(ticket) + 1
+            except ValueError:
+                return 0
+
+    def _eta(self, ticket):
+        position = self._position(ticket)
+        if ticket.future is not None and ticket.future.done():
+            return 0.0
+        with self._lock:
+            avg = self._avg_seconds
+            running = self._running
+        if position == 0:
+            elapsed = time.monotonic() - (ticket.started_at or time.monotonic())
+            return max(0.0, avg - elapsed)
+        # Jobs ahead (running and waiting) drain `concurrency` at a time, then this one renders
+        rounds = (position - 1 + running) // self.concurrency
+        return (rounds + 1) * avg
+
+    def summary(self):
+        with self._lock:
+            return {**self.stats, "running": self._running, "waiting": len(self._waiting),
+                    "avg_render_seconds": round(self._avg_seconds, 2)}
+
+_render_queue = None
+
+def get_render_queue():
+    """Process-wide render queue used by interactive callers"""
+    global _render_queue
+    with _render_lock:
+        if _render_queue is None:
+            _render_queue = RenderQueue()
+    return _render_queue
+
+def generate_pdf_from_html(html_path, pdf_path):
+    """Generate PDF from HTML file using a pooled Playwright browser"""
+    try:
+        with open(html_path, "r", encoding="utf-8") as f:
+            html = f.read()
+    except OSError as e:
+        print(f"Error reading HTML file: {e}")
+        return False
+    
+    try:
+        get_render_service().submit(html, output_pdf=pdf_path).result()
+        return True
     except Exception as e:
         print(f"Error generating PDF: {e}")
-        # Fallback: try sync playwright as last resort
+        # Fallback: render in a worker process as last resort
         try:
-            return _generate_pdf_sync_fallback(html_path, pdf_path)
+            pdf_bytes = get_render_worker_pool().render(html)
+            with open(pdf_path, "wb") as f:
+                f.write(pdf_bytes)
+            return True
         except Exception as e2:
             print(f"Fallback PDF generation also failed: {e2}")
             return False
 
-def _generate_pdf_sync_fallback(html_path, pdf_path):
-    """Fallback sync PDF generation"""
+def render_pdf_bytes(html, use_cache=True):
+    """Render carousel markup straight to PDF bytes (no temporary files).
+
+    Identical markup is served from the render cache unless ``use_cache`` is False.
+    """
+    cache = get_render_cache() if use_cache else None
+    if cache is not None:
+        key = cache.key(html)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
     try:
-        from playwright.sync_api import sync_playwright
-        import subprocess
-        import os
-        
-        # Try to run playwright in a subprocess to avoid event loop conflicts
-        script_content = f'''
-import sys
-from playwright.sync_api import sync_playwright
+        pdf_bytes = get_render_service().submit(html).result()
+    except Exception as e:
+        print(f"Error generating PDF: {e}")
+        print("   Retrying in a fallback render worker...")
+        pdf_bytes = get_render_worker_pool().render(html)
+    if cache is not None:
+        cache.set(key, pdf_bytes)
+    return pdf_bytes
+
+def render_many(jobs, concurrency=4):
+    """Render many carousels concurrently on the pooled browsers.
+
+    ``jobs`` is an iterable of ``(html, output_pdf)`` pairs where ``html`` is the
+    carousel markup. Each job leases its own page and browser context; at most
+    ``concurrency`` run at once. Returns one result dict per job, in order, with
+    ``status`` ("ok" or "error"), ``error``, ``seconds`` and readiness timings.
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return []
+    return get_render_service().call(_render_many_async(jobs, concurrency))
+
+# --- Fallback render workers ---
+# If the in-process render service fails (e.g. Playwright cannot run on the
+# caller's platform loop), jobs go to long-lived worker processes. Each worker
+# keeps its own warm Chromium and receives jobs over a pipe; a worker that
+# crashes or misses its deadline is killed and replaced.
+RENDER_WORKERS = int(os.getenv('CAROUSEL_RENDER_WORKERS', '1'))
 
-def generate_pdf():
+class RenderWorkerError(RuntimeError):
+    """A fallback render worker failed, crashed or missed its deadline"""
+
+def _render_worker_main(conn):
+    """Entry point of a render worker process"""
+    from playwright.sync_api import sync_playwright
+    
     with sync_playwright() as p:
-        browser = p.chromium.launch()
-        page = browser.new_page()
-        page.set_viewport_size({{"width": 1080, "height": 1080}})
-        page.goto("file:///{os.path.abspath(html_path)}")
-        page.wait_for_load_state('networkidle')
-        page.wait_for_timeout(2000)
+        browser = None
+        try:
+            # Launch up front so the first job finds a warm browser
+            browser = p.chromium.launch(args=BROWSER_LAUNCH_ARGS)
+        except Exception:
+            pass  # Retried (and reported) by the first job
         
-        page.pdf(
-            path="{pdf_path}",
-            width="1080px",
-            height="1080px",
-            margin={{"top": "0px", "right": "0px", "bottom": "0px", "left": "0px"}},
-            print_background=True
-        )
-        browser.close()
-        return True
+        while True:
+            try:
+                job = conn.recv()
+            except (EOFError, OSError):
+                break
+            if job is None:
+                break
+            try:
+                if browser is None or not browser.is_connected():
+                    browser = p.chromium.launch(args=BROWSER_LAUNCH_ARGS)
+                conn.send(("ok", _render_in_worker(browser, job)))
+            except Exception as e:
+                conn.send(("error", str(e) or type(e).__name__))
+        
+        if browser is not None:
+            try:
+                browser.close()
+            except Exception:
+                pass
 
-if __name__ == "__main__":
+def _render_in_worker(browser, html):
+    """Synchronous twin of RenderService._render used inside worker processes.
+
+    Returns the PDF bytes with the readiness timings, which the parent records.
+    """
+    context = browser.new_context(
+        viewport={'width': RENDER_OPTIONS["width"], 'height': RENDER_OPTIONS["height"]},
+        device_scale_factor=RENDER_OPTIONS["device_scale_factor"]
+    )
     try:
-        result = generate_pdf()
-        sys.exit(0 if result else 1)
-    except Exception as e:
-        print(f"Error: {{e}}")
-        sys.exit(1)
-'''
-        
-        # Write script to temp file
-        script_path = "temp_pdf_generator.py"
-        with open(script_path, 'w') as f:
-            f.write(script_content)
-        
-        # Run in subprocess
-        result = subprocess.run([sys.executable, script_path], 
-                              capture_output=True, text=True, timeout=60)
-        
-        # Cleanup
-        if os.path.exists(script_path):
-            os.remove(script_path)
+        context.route(f"{ASSET_BASE_URL}**", lambda route: route.fulfill(**_asset_response(route.request.url)))
+        page = context.new_page()
+        page.goto(ASSET_BASE_URL)
+        page.set_content(html)
+        page.evaluate(PRINT_LAYOUT_SCRIPT)
+        timings = page.evaluate(RENDER_READY_SCRIPT, RENDER_READY_TIMEOUT_MS)
+        return page.pdf(**PDF_OPTIONS), timings
+    finally:
+        context.close()
+
+class _RenderWorker:
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_render_worker_main, args=(child_conn,),
+                                   name="carousel-render-worker", daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(5)
+
+class RenderWorkerPool:
+    """Pool of long-lived render worker processes fed over pipes"""
+
+    def __init__(self, size=RENDER_WORKERS):
+        import multiprocessing
+        self.size = max(1, size)
+        self.stats = {"jobs": 0, "failures": 0, "restarts": 0, "timeouts": 0}
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if not self._workers:
+                for _ in range(self.size):
+                    worker = _RenderWorker(self._ctx)
+                    self._workers.append(worker)
+                    self._idle.put(worker)
+
+    def _replace(self, worker):
+        worker.kill()
+        replacement = _RenderWorker(self._ctx)
+        with self._lock:
+            self._workers = [replacement if w is worker else w for w in self._workers]
+        self.stats["restarts"] += 1
+        return replacement
+
+    def render(self, html, timeout=PDF_RENDER_TIMEOUT):
+        """Render markup to PDF bytes in a worker process within ``timeout`` seconds"""
+        self._ensure_started()
+        deadline = time.monotonic() + timeout
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise RenderWorkerError("no render worker became available in time")
         
-        return result.returncode == 0
+        try:
+            if not worker.process.is_alive():
+                worker = self._replace(worker)
+            worker.conn.send(html)
+            if not worker.conn.poll(max(0.0, deadline - time.monotonic())):
+                self.stats["timeouts"] += 1
+                worker = self._replace(worker)
+                raise RenderWorkerError(f"render worker missed its {timeout}s deadline")
+            status, payload = worker.conn.recv()
+        except (EOFError, OSError) as e:
+            self.stats["failures"] += 1
+            worker = self._replace(worker)
+            raise RenderWorkerError(f"render worker crashed: {e}") from e
+        finally:
+            self._idle.put(worker)
         
-    except Exception as e:
-        print(f"Sync fallback failed: {e}")
-        return False
+        self.stats["jobs"] += 1
+        if status != "ok":
+            self.stats["failures"] += 1
+            raise RenderWorkerError(payload)
+        pdf_bytes, timings = payload
+        RENDER_READY_TIMINGS.append(timings)  # The worker's own deque is lost with the process
+        return pdf_bytes
+
+    def shutdown(self):
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+        for worker in workers:
+            worker.process.join(5)
+            worker.kill()
+
+_render_worker_pool = None
+
+def get_render_worker_pool():
+    """Process-wide pool of fallback render workers (started on first use)"""
+    global _render_worker_pool
+    with _render_lock:
+        if _render_worker_pool is None:
+            _render_worker_pool = RenderWorkerPool()
+    return _render_worker_pool
+
+@atexit.register
+def shutdown_render_workers():
+    if _render_worker_pool is not None:
+        _render_worker_pool.shutdown()
+
+PDF_OPTIONS = {
+    "format": None,  # Use custom dimensions
+    "width": '1080px',
+    "height": '1080px',
+    "margin": {'top': '0px', 'right': '0px', 'bottom': '0px', 'left': '0px'},
+    "print_background": True,
+    "prefer_css_page_size": True,  # Use CSS page size
+    "display_header_footer": False,
+    "scale": 1.0,
+    "outline": False,
+    "tagged": False,
+}
+
+# Force exact LinkedIn carousel dimensions with better styling
+PRINT_LAYOUT_SCRIPT = """
+    // Remove all default margins and padding
+    document.body.style.width = '1080px';
+    document.body.style.height = 'auto';
+    document.body.style.overflow = 'hidden';
+    document.body.style.margin = '0';
+    document.body.style.padding = '0';
+    document.documentElement.style.margin = '0';
+    document.documentElement.style.padding = '0';
+
+    // Ensure each slide is exactly 1080x1080
+    const slides = document.querySelectorAll('.slide');
+    slides.forEach((slide, index) => {
+        slide.style.width = '1080px';
+        slide.style.height = '1080px';
+        slide.style.minHeight = '1080px';
+        slide.style.maxHeight = '1080px';
+        slide.style.boxSizing = 'border-box';
+        slide.style.margin = '0';
+        slide.style.padding = '0';
+        slide.style.position = 'relative';
+        slide.style.pageBreakAfter = 'always';
+        slide.style.pageBreakInside = 'avoid';
 
-async def _generate_pdf_async(html_path, pdf_path):
-    """Async PDF generation function"""
-    from playwright.async_api import async_playwright
+        // Ensure fonts are loaded
+        slide.style.fontFamily = "'Inter', -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif";
+
+        // Force background colors to print
+        slide.style.webkitPrintColorAdjust = 'exact';
+        slide.style.colorAdjust = 'exact';
+        slide.style.printColorAdjust = 'exact';
+    });
+
+    // Add print styles
+    const style = document.createElement('style');
+    style.textContent = `
+        @media print {
+            * {
+                -webkit-print-color-adjust: exact !important;
+                color-adjust: exact !important;
+                print-color-adjust: exact !important;
+            }
+            .slide {
+                page-break-after: always !important;
+                page-break-inside: avoid !important;
+            }
+        }
+    `;
+    document.head.appendChild(style);
+"""
+
+async def _print_page_to_pdf(page, pdf_path=None):
+    """Apply the carousel print layout, wait until the page is ready and print it.
+
+    Returns the PDF bytes together with the readiness timings.
+    """
+    await page.evaluate(PRINT_LAYOUT_SCRIPT)
     
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(
-            args=['--no-sandbox', '--disable-setuid-sandbox', '--disable-dev-shm-usage']
-        )
-        context = await browser.new_context(
-            viewport={'width': 1080, 'height': 1080},
-            device_scale_factor=2  # Higher DPI for better quality
-        )
-        page = await context.new_page()
-        
-        # Load the HTML file
-        await page.goto(f"file:///{os.path.abspath(html_path)}")
-        
-        # Wait for everything to load
-        await page.wait_for_load_state('networkidle')
-        await page.wait_for_timeout(3000)  # Longer wait for better rendering
-        
-        # Force exact LinkedIn carousel dimensions with better styling
-        await page.evaluate("""
-            // Remove all default margins and padding
-            document.body.style.width = '1080px';
-            document.body.style.height = 'auto';
-            document.body.style.overflow = 'hidden';
-            document.body.style.margin = '0';
-            document.body.style.padding = '0';
-            document.documentElement.style.margin = '0';
-            document.documentElement.style.padding = '0';
-            
-            // Ensure each slide is exactly 1080x1080
-            const slides = document.querySelectorAll('.slide');
-            slides.forEach((slide, index) => {
-                slide.style.width = '1080px';
-                slide.style.height = '1080px';
-                slide.style.minHeight = '1080px';
-                slide.style.maxHeight = '1080px';
-                slide.style.boxSizing = 'border-box';
-                slide.style.margin = '0';
-                slide.style.padding = '0';
-                slide.style.position = 'relative';
-                slide.style.pageBreakAfter = 'always';
-                slide.style.pageBreakInside = 'avoid';
-                
-                // Ensure fonts are loaded
-                slide.style.fontFamily = "'Inter', -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif";
-                
-                // Force background colors to print
-                slide.style.webkitPrintColorAdjust = 'exact';
-                slide.style.colorAdjust = 'exact';
-                slide.style.printColorAdjust = 'exact';
-            });
+    # Wait for fonts, logos and layout instead of sleeping a fixed amount
+    timings = await _wait_for_render_ready(page)
+    
+    # Generate PDF with exact LinkedIn carousel dimensions
+    pdf_bytes = await page.pdf(path=pdf_path, **PDF_OPTIONS)
+    return pdf_bytes, timings
+
+def _asset_response(url):
+    """Fulfill arguments for a request to ASSET_BASE_URL: a blank document for the root, logos from memory"""
+    name = url[len(ASSET_BASE_URL):].split("?", 1)[0]
+    if not name:
+        return {"body": "<!DOCTYPE html><html><head></head><body></body></html>", "content_type": "text/html"}
+    data = get_asset(name) if name in LOGO_DISPLAY_PX else None
+    if data is None:
+        return {"status": 404, "body": ""}
+    return {"body": data, "content_type": "image/png", "headers": {"Cache-Control": "max-age=31536000"}}
+
+async def _serve_asset(route):
+    await route.fulfill(**_asset_response(route.request.url))
+
+async def _load_html(page, html):
+    """Load carousel markup into a page so relative logo URLs resolve to the in-memory assets"""
+    await page.goto(ASSET_BASE_URL)
+    await page.set_content(html)
+
+async def _render_many_async(jobs, concurrency):
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    pool = get_browser_pool()
+    
+    async def run(html, output_pdf):
+        result = {"output": output_pdf, "status": "ok", "error": None, "seconds": 0.0, "ready": None}
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                # A lease per job: the pool recycles or relaunches the browser between jobs,
+                # so one crash or launch failure only fails the job that hit it
+                async with pool.page() as page:
+                    await asyncio.wait_for(_load_html(page, html), PDF_RENDER_TIMEOUT)
+                    _, result["ready"] = await asyncio.wait_for(
+                        _print_page_to_pdf(page, output_pdf), PDF_RENDER_TIMEOUT
+                    )
+            except Exception as e:
+                result["status"] = "error"
+                result["error"] = str(e) or type(e).__name__
+            result["seconds"] = round(time.monotonic() - started, 3)
+        return result
+    
+    return await asyncio.gather(*(run(html, output_pdf) for html, output_pdf in jobs))
+
+# --- Batch processing ---
+# Many reports are converted in one pipeline: up to BATCH_CONCURRENCY files are
+# with the AI at once (in threads, the OpenAI client is blocking), and every
+# carousel goes to the shared render service as soon as its slides are ready,
+# so PDF rendering overlaps with the remaining generations.
+BATCH_CONCURRENCY = int(os.getenv('CAROUSEL_BATCH_CONCURRENCY', '4'))
+BATCH_RENDER_CONCURRENCY = int(os.getenv('CAROUSEL_BATCH_RENDER_CONCURRENCY', str(max(2, BROWSER_POOL_SIZE * 2))))
+BATCH_SUMMARY_FILE = "carousel_batch_summary.json"
+
+def expand_inputs(patterns):
+    """Markdown files named by paths, directories (their *.md files) or glob patterns, in order and without duplicates"""
+    paths, missing = [], []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(glob.glob(os.path.join(pattern, "*.md")))
+        elif any(ch in pattern for ch in "*?["):
+            matches = sorted(glob.glob(pattern, recursive=True))
+        elif os.path.isfile(pattern):
+            matches = [pattern]
+        else:
+            missing.append(pattern)
+            continue
+        if not matches:
+            missing.append(pattern)
+        paths.extend(m for m in matches if os.path.isfile(m))
+    seen = set()
+    unique = []
+    for path in paths:
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            unique.append(path)
+    return unique, missing
+
+def _batch_output_names(paths, out_dir):
+    """Output base paths per input; inputs sharing a file name get a numeric suffix"""
+    used = collections.Counter()
+    names = []
+    for path in paths:
+        base = os.path.splitext(os.path.basename(path))[0]
+        used[base] += 1
+        if used[base] > 1:
+            base = f"{base}-{used[base]}"
+        names.append(os.path.join(out_dir, f"{base}_carousel"))
+    return names
+
+def _generate_batch_file(path, output_html):
+    """Thread part of a batch job: read, generate slides and stream the HTML to output_html"""
+    result = {}
+    started = time.monotonic()
+    md_text = load_markdown(path)
+    report = {}
+    slides = add_final_slide(generate_slides_incremental(md_text, os.path.abspath(path), report=report))
+    result["generate_s"] = round(time.monotonic() - started, 3)
+    result["slides"] = len(slides)
+    result["cache_hit"] = report.get("cache_hit", False)
+    result["fell_back"] = report.get("fell_back", False)
+    result["model"] = report.get("model")
+    with open(output_html, "w", encoding="utf-8") as f:
+        write_carousel_html(slides, f)
+    return result
+
+async def _run_batch_async(paths, out_names, concurrency, render_concurrency):
+    loop = asyncio.get_running_loop()
+    llm_slots = asyncio.Semaphore(max(1, concurrency))
+    render_slots = asyncio.Semaphore(max(1, render_concurrency))
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="carousel-batch")
+    service = get_render_service()
+    
+    async def run(path, out_name):
+        result = {"input": path, "html": out_name + ".html", "pdf": out_name + ".pdf", "status": "ok", "error": None}
+        started = time.monotonic()
+        try:
+            async with llm_slots:
+                generated = await loop.run_in_executor(executor, _generate_batch_file, path, result["html"])
+            result.update(generated)
             
-            // Add print styles
-            const style = document.createElement('style');
-            style.textContent = `
-                @media print {
-                    * {
-                        -webkit-print-color-adjust: exact !important;
-                        color-adjust: exact !important;
-                        print-color-adjust: exact !important;
-                    }
-                    .slide {
-                        page-break-after: always !important;
-                        page-break-inside: avoid !important;
-                    }
-                }
-            `;
-            document.head.appendChild(style);
-        """)
-        
-        # Generate PDF with exact LinkedIn carousel dimensions
-        await page.pdf(
-            path=pdf_path,
-            format=None,  # Use custom dimensions
-            width='1080px',
-            height='1080px', 
-            margin={'top': '0px', 'right': '0px', 'bottom': '0px', 'left': '0px'},
-            print_background=True,
-            prefer_css_page_size=True,  # Use CSS page size
-            display_header_footer=False,
-            scale=1.0,
-            outline=False,
-            tagged=False
-        )
-        
-        await browser.close()
-        return True
+            # The page is only read back once a render slot is free, so files
+            # waiting to be rendered are not held in memory
+            async with render_slots:
+                render_started = time.monotonic()
+                with open(result["html"], "r", encoding="utf-8") as f:
+                    html = f.read()
+                try:
+                    await service.render(html, result["pdf"])
+                except Exception as e:
+                    print(f"⚠️  {path}: render failed ({e}), retrying in a fallback render worker...")
+                    pdf_bytes = await loop.run_in_executor(None, get_render_worker_pool().render, html)
+                    with open(result["pdf"], "wb") as f:
+                        f.write(pdf_bytes)
+                result["render_s"] = round(time.monotonic() - render_started, 3)
+            if result.get("fell_back"):
+                result["status"] = "fallback"
+        except Exception as e:
+            result["status"] = "error"
+            result["error"] = str(e) or type(e).__name__
+        result["total_s"] = round(time.monotonic() - started, 3)
+        icon = {"ok": "✅", "fallback": "⚠️ ", "error": "❌"}[result["status"]]
+        print(f"{icon} {path} → {result['pdf']} ({result['status']}, {result.get('slides', 0)} slides, {result['total_s']:.1f}s)")
+        return result
+    
+    try:
+        return await asyncio.gather(*(run(path, out_name) for path, out_name in zip(paths, out_names)))
+    finally:
+        executor.shutdown(wait=False)
+
+def run_batch(patterns, out_dir=".", concurrency=BATCH_CONCURRENCY, render_concurrency=BATCH_RENDER_CONCURRENCY, summary_path=None):
+    """Convert every markdown file matched by patterns and write a JSON summary.
+
+    Returns the summary dict: counts, total time and one result per file with
+    ``status`` ("ok", "fallback" when basic parsing was used, "error" or
+    "missing"), slide count and generate/render/total timings in seconds.
+    """
+    paths, missing = expand_inputs(patterns)
+    os.makedirs(out_dir, exist_ok=True)
+    print(f"📦 Batch: {len(paths)} markdown files → {out_dir} (AI concurrency {concurrency}, render concurrency {render_concurrency})")
+    
+    started = time.monotonic()
+    started_at = datetime.datetime.now().isoformat(timespec="seconds")
+    results = asyncio.run(_run_batch_async(paths, _batch_output_names(paths, out_dir), concurrency, render_concurrency)) if paths else []
+    results.extend({"input": pattern, "status": "missing", "error": "No markdown files found"} for pattern in missing)
+    
+    statuses = collections.Counter(result["status"] for result in results)
+    summary = {
+        "started_at": started_at,
+        "total_s": round(time.monotonic() - started, 3),
+        "files": len(results),
+        "ok": statuses["ok"],
+        "fallback": statuses["fallback"],
+        "failed": statuses["error"] + statuses["missing"],
+        "render_ready": render_ready_summary(),
+        "results": results,
+    }
+    summary_path = summary_path or os.path.join(out_dir, BATCH_SUMMARY_FILE)
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    print(f"📊 {summary['ok']} ok, {summary['fallback']} fallback, {summary['failed']} failed in {summary['total_s']:.1f}s - summary: {summary_path}")
+    return summary
+
+if __name__ == "__main__" and CLI_ARGS.llm_backend:
+    LLM_BACKEND = CLI_ARGS.llm_backend
+
+if __name__ == "__main__" and CLI_ARGS.offline:
+    OFFLINE_MODE = True
+
+if __name__ == "__main__" and CLI_ARGS.full:
+    INCREMENTAL_ENABLED = False
+
+if __name__ == "__main__" and CLI_ARGS.batch:
+    summary = run_batch(
+        CLI_ARGS.inputs,
+        CLI_ARGS.out_dir or ".",
+        CLI_ARGS.concurrency or BATCH_CONCURRENCY,
+        CLI_ARGS.render_concurrency or BATCH_RENDER_CONCURRENCY,
+        CLI_ARGS.summary
+    )
+    sys.exit(1 if summary["failed"] else 0)
 
 if __name__ == "__main__":
     # Process the markdown file
@@ -8,14 +8,15 @@ if [ $# -eq 0 ]; then
     echo
     echo "💡 Usage: ./generate_carousel.sh 'your-file.md'"
     echo "📝 Example: ./generate_carousel.sh 'Marketing Report.md'"
+    echo "📦 Batch: ./generate_carousel.sh reports/ --out-dir carousels"
     echo
     exit 1
 fi
 
-echo "📄 Processing: $1"
+echo "📄 Processing: $*"
 echo
 
-python3 generate_carousel.py "$1"
+python3 generate_carousel.py "$@"
 
 echo
 echo "✨ Done! Check the generated files." 
\ No newline at end of file
@@ -1,11 +1,12 @@
 import streamlit as st
 import os
-import tempfile
 import zipfile
-from io import BytesIO
+from io import BytesIO, StringIO
 import base64
+import hashlib
 import datetime
-from generate_carousel import generate_slides_with_ai, create_slide_html, generate_pdf_from_html, generate_html_from_slides as generate_html_from_slides_core
+import time
+from generate_carousel import generate_slides_with_ai, regenerate_slide, find_similar_generation, reuse_similar_generation, get_similar_index, create_slide_html, get_render_cache, get_render_queue, get_llm_cache, summarize_llm_telemetry, render_ready_summary, RenderQueueFull, MarkdownIndex, LARGE_MARKDOWN_BYTES, write_carousel_html
 import json
 
 def get_logo_base64():
@@ -155,6 +156,9 @@ def show_admin_panel():
     
     tab1, tab2, tab3 = st.tabs(["📊 Usage Logs", "📈 Analytics", "⚙️ System Info"])
     
+    # One pass over the telemetry store feeds both the analytics and the performance tab
+    llm_stats = summarize_llm_telemetry(since=time.time() - 86400)
+    
     with tab1:
         st.header("📋 System Logs")
         
@@ -224,6 +228,18 @@ def show_admin_panel():
         with col4:
             st.metric("Errors", errors_count)
         
+        # AI usage over the last 24 hours, from the LLM telemetry store
+        st.subheader("🤖 AI Usage (last 24h)")
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Prompt Tokens", f"{llm_stats['prompt_tokens']:,}")
+        with col2:
+            st.metric("Completion Tokens", f"{llm_stats['completion_tokens']:,}")
+        with col3:
+            st.metric("Estimated Cost", f"${llm_stats['cost_usd']:.2f}")
+        with col4:
+            st.metric("Fallbacks", f"{llm_stats['fallbacks']}/{llm_stats['generations']}")
+        
         # Real system info
         st.subheader("📊 System Status")
         
@@ -274,12 +290,35 @@ def show_admin_panel():
         with col2:
             st.subheader("📊 Performance")
             # Real performance metrics
-            avg_gen_time = st.session_state.get('avg_generation_time', 'N/A')
+            if llm_stats['p50_generation_s'] is not None:
+                gen_time = f"p50 {llm_stats['p50_generation_s']:.1f}s / p95 {llm_stats['p95_generation_s']:.1f}s"
+            else:
+                gen_time = 'N/A'
+            if llm_stats['p50_ttft_s'] is not None:
+                ttft = f"p50 {llm_stats['p50_ttft_s']:.1f}s / p95 {llm_stats['p95_ttft_s']:.1f}s"
+            else:
+                ttft = 'N/A'
             pdf_success_rate = st.session_state.get('pdf_success_rate', 'N/A')
             
-            st.write(f"**Avg Generation Time:** {avg_gen_time}")
+            st.write(f"**Generation Time (24h):** {gen_time}")
+            st.write(f"**Time to First Token (24h):** {ttft}")
+            st.write(f"**AI Calls (24h):** {llm_stats['calls']} ({llm_stats['failed_calls']} failed, {llm_stats['retries']} retries)")
+            st.write(f"**Input Tokens Saved by Outline (24h):** {llm_stats['predigest_tokens_saved']:,}")
             st.write(f"**PDF Success Rate:** {pdf_success_rate}")
             
+            # PDF render cache effectiveness
+            cache_stats = get_render_cache().summary()
+            hit_rate = f"{cache_stats['hit_rate']:.0%}" if cache_stats['hit_rate'] is not None else 'N/A'
+            queue_stats = get_render_queue().summary()
+            st.write(f"**PDF Render Queue:** {queue_stats['running']} running, {queue_stats['waiting']} waiting, {queue_stats['rejected']} rejected")
+            llm_cache_stats = get_llm_cache().stats
+            st.write(f"**AI Response Cache:** {llm_cache_stats['hits']} hits, {llm_cache_stats['misses']} misses, {llm_cache_stats['evictions']} evictions")
+            ready_stats = render_ready_summary()
+            if ready_stats['renders']:
+                st.write(f"**PDF Readiness Wait (last {ready_stats['renders']} renders):** {ready_stats['avg_total_ms']:.0f} ms avg "
+                         f"(fonts {ready_stats['avg_fonts_ms']:.0f}, images {ready_stats['avg_images_ms']:.0f}, layout {ready_stats['avg_layout_ms']:.0f} ms; {ready_stats['timeouts']} timed out)")
+            st.write(f"**PDF Cache Hit Rate:** {hit_rate} ({cache_stats['memory_hits'] + cache_stats['disk_hits']} hits, {cache_stats['misses']} misses, {cache_stats['memory_evictions'] + cache_stats['disk_evictions']} evictions)")
+            
             # Real memory if available
             try:
                 import psutil
@@ -301,6 +340,10 @@ def show_admin_panel():
         col1, col2, col3 = st.columns(3)
         with col1:
             if st.button("🔄 Clear Cache"):
+                get_render_cache().clear()
+                get_llm_cache().clear()
+                get_similar_index().clear()
+                log_activity("INFO: PDF render and AI response caches cleared from admin panel")
                 st.success("Cache cleared!")
         
         with col2:
@@ -372,9 +415,23 @@ def main():
             if os.getenv('OPENAI_API_KEY'):
                 st.success("✅ Using corporate API Key - Premium quality guaranteed!")
             else:
-                st.warning("⚠️ No API key available - Output will be very basic")
+                st.warning("⚠️ No API key available - Slides will be built locally without AI")
                 st.info("💡 Get your personal key at: https://platform.openai.com/api-keys")
         
+        # Response cache opt-out
+        use_llm_cache = st.checkbox(
+            "♻️ Reuse results for identical content",
+            value=True,
+            help="Re-uploading the same markdown returns the previously generated slides instantly instead of calling the AI again. Untick to force a fresh generation."
+        )
+        
+        # Local engine: instant, free, no API key
+        offline_mode = st.checkbox(
+            "⚡ Offline mode (no AI)",
+            value=False,
+            help="Build slides instantly from the markdown structure (headings, lists, figures, quotes) without calling the AI. Free and works without an API key."
+        )
+        
         st.markdown("---")
         
         # Features info
@@ -439,15 +496,37 @@ def main():
             )
             
             if uploaded_file is not None:
-                # Read the file content
-                markdown_content = uploaded_file.read().decode('utf-8')
+                # Index the upload once; reruns reuse the decoded text and preview
+                # file_id changes on every upload, even of an edited file with the same name and size
+                upload_key = getattr(uploaded_file, 'file_id', None) or hashlib.sha256(uploaded_file.getbuffer()).hexdigest()
+                upload = st.session_state.get('upload')
+                if not upload or upload['key'] != upload_key:
+                    index = MarkdownIndex(uploaded_file.getbuffer())
+                    large = index.size > LARGE_MARKDOWN_BYTES
+                    upload = st.session_state.upload = {
+                        'key': upload_key,
+                        'large': large,
+                        'sections': len(index),
+                        'headings': ["  " * max(0, level - 1) + "- " + heading for _, level, heading in index.headings[:40]],
+                        'preview': index.preview(1000),
+                        # The real text keys caches and manifests; generation writes the
+                        # slides of very large files from their outline
+                        'content': index.read(),
+                    }
+                    index.close()
+                markdown_content = upload['content']
                 filename = os.path.splitext(uploaded_file.name)[0]
                 
-                st.success(f"✅ Loaded {len(markdown_content)} characters from {uploaded_file.name}")
+                if upload['large']:
+                    st.success(f"✅ Indexed {uploaded_file.size / 1048576:.1f} MB ({upload['sections']} sections) from {uploaded_file.name}; working from its outline")
+                else:
+                    st.success(f"✅ Loaded {len(markdown_content)} characters from {uploaded_file.name}")
                 
                 # Show preview of content
                 with st.expander("📖 Preview Content"):
-                    st.markdown(markdown_content[:1000] + "..." if len(markdown_content) > 1000 else markdown_content)
+                    if upload['headings']:
+                        st.markdown("\n".join(upload['headings']))
+                    st.markdown(upload['preview'] + "..." if uploaded_file.size > len(upload['preview']) else upload['preview'])
         
         else:
             markdown_content = st.text_area(
@@ -479,21 +558,64 @@ Company X achieved remarkable results by implementing...
         st.header("🎨 Preview & Actions")
         
         if markdown_content:
+            # A near-duplicate of an earlier report can reuse its slides right away; the
+            # lookup runs once per content, not on every rerun
+            similar = None
+            if use_llm_cache and not offline_mode:
+                content_hash = hashlib.sha256(markdown_content.encode('utf-8')).hexdigest()
+                similar_state = st.session_state.get('similar')
+                if not similar_state or similar_state['content_hash'] != content_hash:
+                    similar_state = st.session_state.similar = {
+                        'content_hash': content_hash,
+                        'match': find_similar_generation(markdown_content),
+                    }
+                similar = similar_state['match']
+            if similar:
+                stale_count = len(similar['stale_slides'])
+                st.info(f"♻️ This report is {similar['similarity']:.0%} similar to one converted before. "
+                        f"{stale_count} of its {len(similar['slides'])} slides draw on sections that changed.")
+                reuse_col1, reuse_col2 = st.columns(2)
+                with reuse_col1:
+                    reuse_as_is = st.button("♻️ Use Previous Slides", use_container_width=True)
+                with reuse_col2:
+                    reuse_refreshed = st.button("🔄 Reuse & Refresh Changed", use_container_width=True, disabled=stale_count == 0)
+                
+                if reuse_as_is or reuse_refreshed:
+                    with st.spinner("🔄 Refreshing changed slides..." if reuse_refreshed else "♻️ Loading previous slides..."):
+                        start_time = time.time()
+                        slides = reuse_similar_generation(markdown_content, similar, refresh=reuse_refreshed)
+                        st.session_state.slides = slides
+                        st.session_state.filename = filename
+                        st.session_state.source_markdown = markdown_content
+                        update_metric('generations_today', 1)
+                        update_metric('total_slides_generated', len(slides))
+                        log_activity(f"SUCCESS: Reused {len(slides)} slides from a {similar['similarity']:.0%} similar report "
+                                     f"({stale_count if reuse_refreshed else 0} refreshed) in {time.time() - start_time:.1f}s")
+                    st.success(f"✅ Reused {len(slides)} slides from the earlier report!")
+            
             # Generate button
             if st.button("🚀 Generate Carousel", type="primary", use_container_width=True):
                 with st.spinner("🔄 Generating carousel slides..."):
                     try:
-                        import time
                         start_time = time.time()
                         
-                        # Generate slides
-                        slides = generate_slides_with_ai(markdown_content)
+                        # Generate slides, listing each one as soon as the AI finishes writing it
+                        live_progress = st.empty()
+                        received = []
+                        
+                        def show_slide(slide, index):
+                            received.append(f"✅ Slide {index + 1}: {slide.get('title', 'Untitled')}")
+                            live_progress.markdown("\n\n".join(received))
+                        
+                        slides = generate_slides_with_ai(markdown_content, use_cache=use_llm_cache, on_slide=show_slide, offline=offline_mode)
+                        live_progress.empty()
                         
                         generation_time = time.time() - start_time
                         
                         if slides:
                             st.session_state.slides = slides
                             st.session_state.filename = filename
+                            st.session_state.source_markdown = markdown_content
                             
                             # Update persistent metrics
                             update_metric('generations_today', 1)
@@ -581,6 +703,33 @@ Company X achieved remarkable results by implementing...
                     st.markdown("**Case Studies:**")
                     for case in slide.get('cases', []):
                         st.markdown(f"• {case}")
+            
+            # Rewrite just this slide instead of regenerating the whole carousel
+            if st.session_state.get('source_markdown'):
+                regen_col1, regen_col2 = st.columns([3, 1])
+                with regen_col1:
+                    regen_instructions = st.text_input(
+                        "What should change? (optional)",
+                        key=f"regen_instructions_{slide_index}",
+                        placeholder="e.g. more concrete numbers, shorter bullets"
+                    )
+                with regen_col2:
+                    st.write("")
+                    regenerate_clicked = st.button("🔄 Regenerate Slide", key=f"regen_{slide_index}", use_container_width=True)
+                
+                if regenerate_clicked:
+                    with st.spinner(f"🔄 Regenerating slide {slide_index + 1}..."):
+                        try:
+                            start_time = time.time()
+                            new_slide = regenerate_slide(st.session_state.source_markdown, slides, slide_index, regen_instructions or None)
+                            slides[slide_index] = new_slide
+                            st.session_state.slides = slides
+                            log_activity(f"SUCCESS: Regenerated slide {slide_index + 1} in {time.time() - start_time:.1f}s")
+                            st.rerun()
+                        except Exception as e:
+                            log_activity(f"ERROR: Exception in slide regeneration: {str(e)}")
+                            update_metric('errors_count', 1)
+                            st.error(f"❌ Error regenerating slide: {str(e)}")
         
         # Download section
         st.markdown("---")
@@ -602,12 +751,15 @@ Company X achieved remarkable results by implementing...
                             "cta_text": "Contact ProjectWorkLab"
                         }
                         all_slides = slides + [final_slide]
-                        html_content = generate_html_from_slides_core(all_slides)
+                        # Embed the logos so the downloaded file renders on its own; the page
+                        # is streamed straight into the download payload as UTF-8
+                        html_buffer = BytesIO()
+                        write_carousel_html(all_slides, html_buffer, inline_assets=True)
                         
                         # Create download button for HTML
                         st.download_button(
                             label="⬇️ Download HTML",
-                            data=html_content,
+                            data=html_buffer,
                             file_name=f"{filename}_carousel.html",
                             mime="text/html",
                             use_container_width=True
@@ -632,67 +784,50 @@ Company X achieved remarkable results by implementing...
                             "cta_text": "Contact ProjectWorkLab"
                         }
                         all_slides = slides + [final_slide]
-                        html_content = generate_html_from_slides_core(all_slides)
-                        
-                        # Create temporary HTML file
-                        with tempfile.NamedTemporaryFile(mode='w', suffix='.html', delete=False, encoding='utf-8') as tmp_html:
-                            tmp_html.write(html_content)
-                            tmp_html_path = tmp_html.name
-                        
-                        # Generate PDF
-                        pdf_path = tmp_html_path.replace('.html', '.pdf')
+                        html_buffer = StringIO()
+                        write_carousel_html(all_slides, html_buffer)
+                        html_content = html_buffer.getvalue()
                         
                         # Show progress
                         progress_text = st.empty()
-                        progress_text.text("🔄 Initializing PDF generation...")
                         
-                        success = generate_pdf_from_html(tmp_html_path, pdf_path)
+                        # Render straight to bytes through the shared render queue - no temporary
+                        # HTML/PDF files, and a full queue is rejected right away instead of
+                        # launching yet another browser
+                        ticket = get_render_queue().submit(html_content)
+                        while not ticket.done():
+                            position = ticket.position()
+                            if position:
+                                progress_text.text(f"⏳ Waiting for the PDF renderer - position {position} in queue, about {ticket.eta_seconds():.0f}s")
+                            else:
+                                progress_text.text(f"🔄 Rendering PDF... about {ticket.eta_seconds():.0f}s left")
+                            time.sleep(0.5)
+                        pdf_data = ticket.result()
+                        progress_text.text(f"✅ PDF generated ({len(pdf_data)} bytes)")
                         
-                        progress_text.text("🔄 Checking PDF output...")
+                        # Create download button for PDF
+                        if st.download_button(
+                            label="⬇️ Download PDF",
+                            data=pdf_data,
+                            file_name=f"{filename}_carousel.pdf",
+                            mime="application/pdf",
+                            use_container_width=True
+                        ):
+                            # Log PDF download and update metrics
+                            update_metric('pdf_downloads', 1)
+                            log_activity(f"INFO: PDF downloaded - {filename}_carousel.pdf ({len(pdf_data)} bytes)")
                         
-                        if success and os.path.exists(pdf_path):
-                            # Check file size
-                            file_size = os.path.getsize(pdf_path)
-                            progress_text.text(f"✅ PDF generated ({file_size} bytes)")
-                            
-                            # Read PDF file
-                            with open(pdf_path, 'rb') as pdf_file:
-                                pdf_data = pdf_file.read()
-                            
-                            # Create download button for PDF
-                            if st.download_button(
-                                label="⬇️ Download PDF",
-                                data=pdf_data,
-                                file_name=f"{filename}_carousel.pdf",
-                                mime="application/pdf",
-                                use_container_width=True
-                            ):
-                                # Log PDF download and update metrics
-                                update_metric('pdf_downloads', 1)
-                                log_activity(f"INFO: PDF downloaded - {filename}_carousel.pdf ({len(pdf_data)} bytes)")
-                            
-                            st.success(f"✅ PDF generated successfully! ({len(pdf_data)} bytes)")
-                            
-                            # Cleanup
-                            try:
-                                os.unlink(tmp_html_path)
-                                os.unlink(pdf_path)
-                            except:
-                                pass  # Ignore cleanup errors
-                        else:
-                            progress_text.text("❌ PDF generation failed")
-                            st.error("❌ Failed to generate PDF")
-                            st.info("💡 Try refreshing the page and generating again")
-                            
-                            # Show debug info
-                            st.write(f"Debug info:")
-                            st.write(f"- Success flag: {success}")
-                            st.write(f"- PDF path exists: {os.path.exists(pdf_path) if pdf_path else 'No path'}")
-                            st.write(f"- HTML path: {tmp_html_path}")
-                            st.write(f"- PDF path: {pdf_path}")
+                        st.success(f"✅ PDF generated successfully! ({len(pdf_data)} bytes)")
+                    
+                    except RenderQueueFull:
+                        log_activity("INFO: PDF request rejected - render queue full")
+                        st.warning("🚦 The PDF renderer is busy right now. Please try again in a minute.")
                     
                     except Exception as e:
+                        log_activity(f"ERROR: PDF generation failed: {str(e)}")
+                        update_metric('errors_count', 1)
                         st.error(f"❌ Error generating PDF: {str(e)}")
+                        st.info("💡 Try refreshing the page and generating again")
 
     # Footer
     st.markdown("---")
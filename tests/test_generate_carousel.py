@@ -0,0 +1,607 @@
+import os
+
+import pytest
+
+import generate_carousel
+
+
+def test_disk_cache_peek_does_not_count_or_touch(tmp_path):
+    cache = generate_carousel.DiskCache(str(tmp_path), 1024 * 1024, suffix=".json")
+    cache.set("k", b"[]")
+    assert cache.get("k", record=False) == b"[]"
+    assert cache.get("missing", record=False) is None
+    assert cache.stats["hits"] == 0 and cache.stats["misses"] == 0
+    assert cache.get("k") == b"[]"
+    assert cache.stats["hits"] == 1
+
+
+REPORT = """# Q3 Report
+
+Revenue grew 40% this quarter.
+
+## Clients
+
+- 3 new enterprise clients signed
+- Retention at 95%
+
+## Delivery
+
+- Delivery time cut from 10 to 5 days
+- 2x faster onboarding
+"""
+
+REPORT_SLIDES = [
+    {"type": "title", "title": "Q3 Report", "subtitle": "Revenue grew 40% this quarter", "highlight": "40% growth"},
+    {"type": "list", "title": "Clients", "items": ["3 new enterprise clients signed", "Retention at 95%"]},
+    {"type": "list", "title": "Delivery", "items": ["Delivery time cut from 10 to 5 days", "2x faster onboarding"]},
+]
+
+
+@pytest.fixture
+def manifests(tmp_path, monkeypatch):
+    monkeypatch.setattr(generate_carousel, "MANIFEST_DIR", str(tmp_path))
+    monkeypatch.setattr(generate_carousel, "INCREMENTAL_ENABLED", True)
+    monkeypatch.setattr(generate_carousel, "OFFLINE_MODE", False)
+    return str(tmp_path)
+
+
+def test_failed_regeneration_stays_stale(manifests, monkeypatch):
+    generate_carousel.save_manifest("report", REPORT, REPORT_SLIDES)
+    edited = REPORT.replace("5 days", "4 days")
+
+    def failing_regenerate(*args, **kwargs):
+        raise RuntimeError("OpenAI API key not found")
+
+    monkeypatch.setattr(generate_carousel, "regenerate_slide", failing_regenerate)
+    report = {}
+    slides = generate_carousel.generate_slides_incremental(edited, "report", report=report)
+    assert slides == REPORT_SLIDES
+    assert report["regenerated"] == 0 and report["regenerate_failed"] == 1
+    assert generate_carousel.plan_incremental_update(generate_carousel.load_manifest("report"), edited) == [2]
+
+    monkeypatch.setattr(generate_carousel, "regenerate_slide", lambda md_text, slides, index, instructions=None: dict(slides[index], items=["Delivery time cut from 10 to 4 days"]))
+    report = {}
+    generate_carousel.generate_slides_incremental(edited, "report", report=report)
+    assert report["regenerated"] == 1
+    assert generate_carousel.plan_incremental_update(generate_carousel.load_manifest("report"), edited) == []
+
+
+def test_partial_generation_is_not_saved_as_manifest(manifests, monkeypatch):
+    def partial(md_text, on_slide=None, report=None):
+        report.update(fell_back=False, fallback_reason="partial: connection reset")
+        return REPORT_SLIDES[:2]
+
+    monkeypatch.setattr(generate_carousel, "generate_slides_with_ai", partial)
+    generate_carousel.generate_slides_incremental(REPORT, "report")
+    assert generate_carousel.load_manifest("report") is None
+
+
+def test_render_timeout_starts_after_browser_lease(monkeypatch):
+    import asyncio
+    import contextlib
+
+    class OneBrowserPool:
+        def __init__(self):
+            self.lock = None
+
+        @contextlib.asynccontextmanager
+        async def page(self):
+            self.lock = self.lock or asyncio.Lock()
+            async with self.lock:
+                yield object()
+
+        async def close(self):
+            pass
+
+    async def slow_load(page, html):
+        await asyncio.sleep(0.3)
+
+    async def fake_print(page, output_pdf):
+        return b"%PDF-fake", None
+
+    monkeypatch.setattr(generate_carousel, "_load_html", slow_load)
+    monkeypatch.setattr(generate_carousel, "_print_page_to_pdf", fake_print)
+    service = generate_carousel.RenderService(pool=OneBrowserPool())
+    try:
+        # Each render takes 0.3s of its 0.5s budget; the later ones wait longer than that for the browser
+        futures = [service.submit("<html></html>", timeout=0.5) for _ in range(3)]
+        assert [future.result(5) for future in futures] == [b"%PDF-fake"] * 3
+    finally:
+        service.shutdown()
+
+
+def test_render_many_fails_only_the_job_whose_lease_failed(monkeypatch):
+    import asyncio
+    import contextlib
+
+    class FlakyPool:
+        def __init__(self):
+            self.leases = 0
+
+        @contextlib.asynccontextmanager
+        async def page(self):
+            self.leases += 1
+            if self.leases == 2:
+                raise RuntimeError("browser launch failed")
+            yield object()
+
+    async def fake_load(page, html):
+        pass
+
+    async def fake_print(page, output_pdf):
+        return b"%PDF-fake", {"fonts": 0.0}
+
+    pool = FlakyPool()
+    monkeypatch.setattr(generate_carousel, "get_browser_pool", lambda: pool)
+    monkeypatch.setattr(generate_carousel, "_load_html", fake_load)
+    monkeypatch.setattr(generate_carousel, "_print_page_to_pdf", fake_print)
+    jobs = [("<html></html>", f"{name}.pdf") for name in "abc"]
+    results = asyncio.run(generate_carousel._render_many_async(jobs, 1))
+    assert [r["status"] for r in results] == ["ok", "error", "ok"]
+    assert results[1]["error"] == "browser launch failed"
+    assert pool.leases == 3
+
+
+def test_pool_checks_memory_of_the_leased_browser_only(monkeypatch):
+    import asyncio
+
+    running = {900}  # A browser of some other pool or worker, already running
+
+    class FakeBrowser:
+        def on(self, event, callback):
+            pass
+
+        def is_connected(self):
+            return True
+
+        async def close(self):
+            pass
+
+    class FakeChromium:
+        async def launch(self, args):
+            running.add(1000 + len(running))
+            return FakeBrowser()
+
+    class FakePlaywright:
+        chromium = FakeChromium()
+
+    memory = {900: 5000, 1001: 100}
+    monkeypatch.setattr(generate_carousel, "_chromium_browser_pids", lambda: set(running))
+    monkeypatch.setattr(generate_carousel, "_browser_memory_mb", lambda pid: memory.get(pid))
+
+    async def scenario():
+        pool = generate_carousel.BrowserPool(size=1, max_memory_mb=700)
+        pool._playwright = FakePlaywright()
+        pool._available = asyncio.Condition()
+        pool._slots = [generate_carousel._PooledBrowser(pool, 0)]
+        pool._start_task = asyncio.ensure_future(asyncio.sleep(0))
+        async with pool.browser() as lease:
+            assert lease.pid == 1001
+        assert pool.stats["recycles"] == 0  # 100 MB, although all Chromium together uses far more
+        memory[1001] = 800
+        async with pool.browser():
+            pass
+        assert pool.stats["recycles"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_pool_shares_a_browser_between_concurrent_pages(monkeypatch):
+    import asyncio
+
+    class FakeContext:
+        async def route(self, url, handler):
+            pass
+
+        async def new_page(self):
+            return object()
+
+        async def close(self):
+            pass
+
+    class FakeBrowser:
+        def __init__(self):
+            self.closed = False
+
+        def on(self, event, callback):
+            pass
+
+        def is_connected(self):
+            return not self.closed
+
+        async def new_context(self, **kwargs):
+            return FakeContext()
+
+        async def close(self):
+            self.closed = True
+
+    class FakeChromium:
+        async def launch(self, args):
+            return FakeBrowser()
+
+    class FakePlaywright:
+        chromium = FakeChromium()
+
+    monkeypatch.setattr(generate_carousel, "_chromium_browser_pids", lambda: None)
+
+    async def scenario():
+        pool = generate_carousel.BrowserPool(size=1, max_jobs=4, max_memory_mb=0, max_contexts=2)
+        pool._playwright = FakePlaywright()
+        pool._available = asyncio.Condition()
+        pool._slots = [generate_carousel._PooledBrowser(pool, 0)]
+        pool._start_task = asyncio.ensure_future(asyncio.sleep(0))
+        running = {"now": 0, "peak": 0}
+
+        async def job():
+            async with pool.page():
+                running["now"] += 1
+                running["peak"] = max(running["peak"], running["now"])
+                await asyncio.sleep(0.01)
+                running["now"] -= 1
+
+        await asyncio.gather(*(job() for _ in range(6)))
+        return pool, running["peak"]
+
+    pool, peak = asyncio.run(scenario())
+    assert peak == 2  # Both contexts of the single browser in use at once
+    assert pool.stats["jobs"] == 6
+    # Recycled after its 4th render once the in-flight pages finished, then relaunched
+    assert pool.stats["launches"] == 2 and pool.stats["recycles"] == 1
+
+
+def test_condensed_notes_of_many_sections_fit_the_prompt(monkeypatch):
+    document = "".join(f"## Section {i}\n\n" + f"Revenue in region {i} grew {i}% year over year. " * 40 + "\n\n" for i in range(40))
+
+    def wordy_condense(chunk, target_chars, generation=None, policy=None):
+        # Keeps the headings but overshoots the requested length, as models do
+        headings = "\n".join(line for line in chunk.splitlines() if line.startswith("## "))
+        return (headings + "\n" + "x" * target_chars * 3)[:max(len(headings), target_chars * 2)]
+
+    monkeypatch.setattr(generate_carousel, "_condense_chunk", wordy_condense)
+    notes = generate_carousel.condense_markdown(document, concurrency=1)
+    assert len(notes) <= generate_carousel.DIRECT_CONTENT_CHARS
+    assert "## Section 39" in notes
+    messages = generate_carousel.build_slides_messages(notes)
+    assert "[Content truncated" not in messages[-1]["content"]
+
+
+def test_benchmark_backends_stay_out_of_cost_and_latency(tmp_path, monkeypatch):
+    monkeypatch.setattr(generate_carousel, "LLM_TELEMETRY_FILE", str(tmp_path / "telemetry.jsonl"))
+
+    def run(backend, latency):
+        monkeypatch.setattr(generate_carousel, "LLM_BACKEND", backend)
+        generation = {"kind": "generation", "generation_id": backend, "latency_s": latency}
+        with generate_carousel.LLMCallRecord("slides", "gpt-4o", generation) as call:
+            call.usage(type("Usage", (), {"prompt_tokens": 1000, "completion_tokens": 1000})())
+        generate_carousel.record_llm_event(generation)
+        return call.data
+
+    standin = run("standin", 0.1)
+    real = run("openai", 9.0)
+    assert standin["backend"] == "standin" and standin["cost_usd"] is None
+    assert real["backend"] == "openai" and real["cost_usd"] > 0
+    summary = generate_carousel.summarize_llm_telemetry()
+    assert summary["generations"] == 1 and summary["calls"] == 1
+    assert summary["p50_generation_s"] == 9.0
+    assert summary["cost_usd"] == round(real["cost_usd"], 4)
+
+
+def test_local_engine_reads_inline_markup_tables_and_raw_html():
+    sections = generate_carousel._markdown_sections("""# Report
+Intro with **bold**, a [link](http://example.com) and `code`. ![Revenue chart](chart.png)
+- item one 40%
+- item two $5M
+<div>Raw HTML block</div>
+
+| Region | Growth |
+|---|---|
+| EMEA | 12% |
+
+```
+# not a heading
+```
+## Case Study: Acme
+> Acme grew 50% in a year.
+""")
+    assert [s["heading"] for s in sections] == ["Report", "Case Study: Acme"]
+    report, case = sections
+    assert report["paragraphs"][0] == "Intro with bold, a link and code. Revenue chart"
+    assert report["items"] == ["item one 40%", "item two $5M", "EMEA · 12%"]
+    assert case["quotes"] == ["Acme grew 50% in a year."]
+    assert not any("\x02" in text or "wzxhzdk" in text for s in sections for text in s["paragraphs"] + s["items"])
+
+
+def test_manifest_is_invalidated_by_backend_model_and_prompt_version(manifests, monkeypatch):
+    monkeypatch.setattr(generate_carousel, "LLM_BACKEND", "standin")
+    generate_carousel.save_manifest("report", REPORT, REPORT_SLIDES)
+    assert generate_carousel.load_manifest("report") is not None
+    monkeypatch.setattr(generate_carousel, "LLM_BACKEND", "openai")
+    assert generate_carousel.load_manifest("report") is None
+
+    generate_carousel.save_manifest("report", REPORT, REPORT_SLIDES)
+    assert generate_carousel.load_manifest("report") is not None
+    monkeypatch.setattr(generate_carousel, "PROMPT_VERSION", generate_carousel.PROMPT_VERSION + 1)
+    assert generate_carousel.load_manifest("report") is None
+    monkeypatch.setattr(generate_carousel, "PROMPT_VERSION", generate_carousel.PROMPT_VERSION - 1)
+    monkeypatch.setattr(generate_carousel, "LLM_MODEL", "another-model")
+    assert generate_carousel.load_manifest("report") is None
+
+
+def test_manifest_plan_needs_full_run_when_sections_change(manifests):
+    generate_carousel.save_manifest("report", REPORT, REPORT_SLIDES)
+    manifest = generate_carousel.load_manifest("report")
+    assert generate_carousel.plan_incremental_update(manifest, REPORT) == []
+    assert generate_carousel.plan_incremental_update(manifest, REPORT + "\n## Outlook\n\nMore to come.\n") is None
+    assert generate_carousel.plan_incremental_update(manifest, REPORT.replace("## Delivery", "## Operations")) is None
+
+
+def test_standin_answers_from_the_document_not_the_instructions(monkeypatch):
+    import json
+    import types
+
+    captured = {}
+
+    def create(**kwargs):
+        captured.update(kwargs)
+
+    client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+    monkeypatch.setattr(generate_carousel, "get_llm_client", lambda: client)
+    generate_carousel._create_condense_completion(REPORT, 500)
+    condensed = generate_carousel._standin_content(captured)
+    assert condensed.startswith("Q3 Report") and "Condense" not in condensed
+
+    messages = generate_carousel.build_regenerate_messages(REPORT, REPORT_SLIDES, 1)
+    answer = generate_carousel._standin_content({"messages": messages, "response_format": generate_carousel._slide_response_format("list")})
+    assert "Rewrite slide" not in answer
+    assert json.loads(answer)["slide"]["title"] in REPORT
+
+
+def test_large_markdown_is_loaded_whole_and_outlined_for_the_prompt(tmp_path, monkeypatch):
+    monkeypatch.setattr(generate_carousel, "LARGE_MARKDOWN_BYTES", 100)
+    path = tmp_path / "report.md"
+    path.write_text(REPORT, encoding="utf-8")
+    md_text = generate_carousel.load_markdown(str(path))
+    assert md_text == REPORT
+    assert generate_carousel.is_large_markdown(md_text)
+    assert generate_carousel.llm_cache_key(md_text) != generate_carousel.llm_cache_key(generate_carousel.build_outline(md_text))
+    content, is_outline = generate_carousel.predigest_markdown(md_text, large=True)
+    assert is_outline and content == generate_carousel.build_outline(md_text)
+
+
+def test_worker_render_timings_are_recorded_in_the_parent(monkeypatch):
+    import collections
+    import types
+
+    class FakeConn:
+        def send(self, html):
+            pass
+
+        def poll(self, timeout):
+            return True
+
+        def recv(self):
+            return "ok", (b"%PDF-fake", {"fonts_ms": 4, "images_ms": 6, "layout_ms": 2, "total_ms": 12, "timed_out": False})
+
+    monkeypatch.setattr(generate_carousel, "RENDER_READY_TIMINGS", collections.deque(maxlen=200))
+    pool = generate_carousel.RenderWorkerPool(size=1)
+    worker = types.SimpleNamespace(conn=FakeConn(), process=types.SimpleNamespace(is_alive=lambda: True))
+    pool._workers = [worker]
+    pool._idle.put(worker)
+    assert pool.render("<html></html>") == b"%PDF-fake"
+    summary = generate_carousel.render_ready_summary()
+    assert summary["renders"] == 1 and summary["avg_total_ms"] == 12
+
+
+def test_telemetry_file_is_rotated_and_still_read(tmp_path, monkeypatch):
+    path = tmp_path / "telemetry.jsonl"
+    monkeypatch.setattr(generate_carousel, "LLM_TELEMETRY_FILE", str(path))
+    monkeypatch.setattr(generate_carousel, "LLM_TELEMETRY_MAX_MB", 300 / (1024 * 1024))
+    monkeypatch.setattr(generate_carousel, "LLM_BACKEND", "openai")
+    for i in range(10):
+        generate_carousel.record_llm_event({"kind": "generation", "generation_id": str(i), "latency_s": 1.0})
+    assert (tmp_path / "telemetry.jsonl.1").exists()
+    assert path.stat().st_size <= 300 + 200
+    records = generate_carousel.load_llm_telemetry("generation")
+    assert [r["generation_id"] for r in records] == [str(i) for i in range(10)][-len(records):]
+    assert len(records) < 10 and generate_carousel.summarize_llm_telemetry()["generations"] == len(records)
+
+
+def test_predigest_keeps_raw_text_when_the_outline_saves_too_few_tokens(monkeypatch):
+    # Every line is a bullet with a figure, so the outline repeats the document
+    dense = "# Figures\n\n" + "\n".join(f"- Metric {i} rose by {i}% to {i * 10} units this year" for i in range(40))
+    assert generate_carousel.predigest_markdown(dense) == (dense, False)
+
+    prose = "# Report\n\n" + "\n\n".join(
+        f"The team spent the quarter refining the process in area {i}. Nothing else changed there, and morale stayed high. "
+        "Meetings were held weekly and notes were shared with everyone involved." for i in range(30)
+    )
+    content, is_outline = generate_carousel.predigest_markdown(prose)
+    assert is_outline
+    assert generate_carousel.estimate_tokens(content) < generate_carousel.estimate_tokens(prose) * 0.9
+
+
+def test_llm_cache_key_follows_predigest_and_condense_settings(monkeypatch):
+    key = generate_carousel.llm_cache_key(REPORT)
+    monkeypatch.setattr(generate_carousel, "PREDIGEST_ENABLED", False)
+    raw_key = generate_carousel.llm_cache_key(REPORT)
+    assert raw_key != key
+    monkeypatch.setattr(generate_carousel, "CONDENSE_MODEL", "gpt-4o")
+    assert generate_carousel.llm_cache_key(REPORT) != raw_key
+
+
+def test_llm_call_policy_retries_steps_down_and_respects_the_budget(tmp_path, monkeypatch):
+    import openai
+
+    monkeypatch.setattr(generate_carousel, "LLM_TELEMETRY_FILE", str(tmp_path / "telemetry.jsonl"))
+    monkeypatch.setattr(generate_carousel.time, "sleep", lambda seconds: None)
+    request = None  # The policy only looks at the error type
+    policy = generate_carousel.LLMCallPolicy(budget_s=60, models=["big", "small"], max_attempts=3)
+    seen = []
+
+    def flaky(model, timeout):
+        seen.append(model)
+        if len(seen) == 1:
+            raise openai.APITimeoutError(request=request)
+        return "response"
+
+    assert policy.call("slides", flaky) == "response"
+    assert seen == ["big", "small"]  # A timed-out model is not tried again
+
+    def broken(model, timeout):
+        seen.append(model)
+        raise ValueError("bad request")
+
+    seen.clear()
+    with pytest.raises(ValueError):
+        policy.call("slides", broken)
+    assert len(seen) == 1  # Not retryable
+
+    def down(model, timeout):
+        seen.append(model)
+        raise openai.APIConnectionError(request=request)
+
+    seen.clear()
+    with pytest.raises(openai.APIConnectionError):
+        policy.call("slides", down)
+    assert len(seen) == 3  # max_attempts
+
+    policy.deadline = generate_carousel.time.monotonic() - 1
+    with pytest.raises(generate_carousel.LLMDeadlineExceeded):
+        policy.call("slides", lambda model, timeout: "response")
+
+
+def test_slide_stream_parser_handles_escapes_and_any_chunk_split():
+    import json
+
+    slides = [
+        {"type": "title", "title": 'The "fast" path {not a brace}', "subtitle": "Back\\slash ] and [ brackets"},
+        {"type": "list", "title": "Quotes \\\" inside", "items": ["a } b", "c\\\\"]},
+    ]
+    stream = '```json\n{"slides": ' + json.dumps(slides) + '}\n```'
+    for size in (1, 2, 3, 7, len(stream)):
+        parser = generate_carousel.SlideStreamParser()
+        parsed = []
+        for i in range(0, len(stream), size):
+            parsed.extend(parser.feed(stream[i:i + size]))
+        assert parsed == slides, size
+        assert parser.closed
+
+
+def test_similarity_index_matches_near_duplicates_only(tmp_path):
+    index = generate_carousel.SimilarityIndex(str(tmp_path))
+    teams = "sales support design finance legal data platform mobile web research".split()
+    report = "# Annual review\n\n" + "\n".join(
+        f"- The {teams[i % 10]} team shipped {i} features for {teams[i * 7 % 10]} clients in region {i % 9}" for i in range(120)
+    )
+    index.add("report", report)
+
+    edited = report.replace("shipped 5 features", "shipped 6 features", 1)
+    match = index.nearest(edited)
+    assert match is not None and match[1] == "report"
+    assert match[0] >= generate_carousel.SIMILAR_THRESHOLD
+
+    other = "# Hiring plan\n\n" + "\n".join(f"- Open role {i} in the design team" for i in range(30))
+    assert generate_carousel.simhash_similarity(generate_carousel.simhash(other), generate_carousel.simhash(report)) < generate_carousel.SIMILAR_THRESHOLD
+    assert index.nearest(other) is None
+    assert index.nearest(report, exclude="report") is None
+
+
+def test_markdown_index_offsets_match_the_text_sections(tmp_path):
+    md_text = (
+        "Intro before any heading — “quoted”\n\n"
+        "# Café résumé\n\nRevenue 40% 🚀\n\n"
+        "```python\n# not a heading\n```\n\n"
+        "## Next steps ##\r\n- ship it\r\n"
+    )
+    path = tmp_path / "report.md"
+    path.write_bytes(b"\xef\xbb\xbf" + md_text.encode("utf-8"))
+    with generate_carousel.MarkdownIndex(str(path)) as index:
+        assert [(level, heading) for _, level, heading in index.headings] == [(1, "Café résumé"), (2, "Next steps")]
+        raw = path.read_bytes()
+        for offset, _, heading in index.headings:
+            assert raw[offset:].startswith(b"#")
+        # Spans tile the document after the BOM without gaps or overlaps
+        assert index.spans[0][0] == 3 and index.spans[-1][1] == len(raw)
+        assert all(a[1] == b[0] for a, b in zip(index.spans, index.spans[1:]))
+        assert index.read() == md_text
+        sections = list(index.iter_sections())
+        assert [s["text"] for s in sections] == [s["text"] for s in generate_carousel.split_markdown_sections(md_text)]
+        assert index.preview(5) == md_text[:5]
+
+
+def test_escape_html_and_templates_escape_every_field():
+    assert generate_carousel.escape_html("<a href=\"x\">Tom & Jerry's</a>") == "&lt;a href=&quot;x&quot;&gt;Tom &amp; Jerry&#x27;s&lt;/a&gt;"
+    assert generate_carousel.escape_html(None) == "" and generate_carousel.escape_html(42) == "42"
+    assert generate_carousel.escape_html("&amp;") == "&amp;amp;"  # Text is never treated as markup
+
+    html = generate_carousel.create_slide_html({
+        "type": "list",
+        "title": "<script>alert(1)</script>",
+        "subtitle": 'Growth "40%"',
+        "items": ["R&D <b>doubled</b>", "It's done"],
+    })
+    assert "<script>" not in html and "&lt;script&gt;alert(1)&lt;/script&gt;" in html
+    assert "<p class='subtitle'>Growth &quot;40%&quot;</p>" in html
+    assert "<div class='item'>R&amp;D &lt;b&gt;doubled&lt;/b&gt;</div>" in html
+    assert "description" not in html  # Empty sections are left out
+
+    template = generate_carousel.SlideTemplate("{{#items}}[{{.}}]{{/items}}")
+    assert template.render(type("Slide", (), {"items": ["<1>", "2"]})()) == "[&lt;1&gt;][2]"
+    with pytest.raises(generate_carousel.TemplateError):
+        generate_carousel.SlideTemplate("{{#items}}{{.}}")
+
+
+def test_render_queue_rejects_jobs_when_full(monkeypatch):
+    import asyncio
+    import contextlib
+    import threading
+
+    release = threading.Event()
+
+    class FakePool:
+        @contextlib.asynccontextmanager
+        async def page(self):
+            yield object()
+
+        async def close(self):
+            pass
+
+    async def blocked_load(page, html):
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+
+    async def fake_print(page, output_pdf):
+        return b"%PDF-fake", None
+
+    monkeypatch.setattr(generate_carousel, "_load_html", blocked_load)
+    monkeypatch.setattr(generate_carousel, "_print_page_to_pdf", fake_print)
+    service = generate_carousel.RenderService(pool=FakePool())
+    queue = generate_carousel.RenderQueue(concurrency=1, max_depth=1, service=service)
+    try:
+        tickets = [queue.submit("<html>1</html>", use_cache=False), queue.submit("<html>2</html>", use_cache=False)]
+        with pytest.raises(generate_carousel.RenderQueueFull):
+            queue.submit("<html>3</html>", use_cache=False)
+        assert queue.stats["rejected"] == 1 and queue.stats["submitted"] == 2
+        release.set()
+        assert [ticket.future.result(5) for ticket in tickets] == [b"%PDF-fake"] * 2
+        assert queue.submit("<html>4</html>", use_cache=False).future.result(5) == b"%PDF-fake"
+    finally:
+        service.shutdown()
+
+
+def test_expand_inputs_handles_dirs_globs_files_and_duplicates(tmp_path):
+    reports = tmp_path / "reports"
+    (reports / "nested").mkdir(parents=True)
+    for name in ("b.md", "a.md", "notes.txt", "nested/c.md"):
+        (reports / name).write_text("# Report\n", encoding="utf-8")
+
+    paths, missing = generate_carousel.expand_inputs([
+        str(reports),                        # Only the directory's own *.md files, sorted
+        str(reports / "**" / "*.md"),        # Recursive glob, overlapping with the directory
+        str(reports / "a.md"),               # Already listed
+        str(reports / "notes.txt"),          # Named files are taken whatever their extension
+        str(tmp_path / "missing.md"),
+        str(tmp_path / "none-*.md"),
+    ])
+    assert [os.path.relpath(p, reports) for p in paths] == ["a.md", "b.md", os.path.join("nested", "c.md"), "notes.txt"]
+    assert missing == [str(tmp_path / "missing.md"), str(tmp_path / "none-*.md")]
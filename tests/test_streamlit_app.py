@@ -0,0 +1,116 @@
+import os
+
+import pytest
+
+pytest.importorskip("streamlit")
+from streamlit.testing.v1 import AppTest
+
+import generate_carousel
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "streamlit_app.py")
+
+SLIDES = [
+    {"type": "title", "title": "Q3 Report", "subtitle": "Growth & results", "highlight": "40% up"},
+    {"type": "list", "title": "Wins", "items": ["3 new clients", "2x faster delivery"]},
+]
+
+
+class FakeTicket:
+    def __init__(self, html):
+        self.html = html
+        self.polls = 0
+
+    def done(self):
+        self.polls += 1
+        return self.polls > 1  # Makes the app poll (and sleep) once
+
+    def position(self):
+        return 0
+
+    def eta_seconds(self):
+        return 0
+
+    def result(self):
+        return b"%PDF-fake"
+
+
+class FakeQueue:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, html):
+        self.submitted.append(html)
+        return FakeTicket(html)
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # The app writes its logs and metrics to the working directory
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    at = AppTest.from_file(APP, default_timeout=30)
+    at.session_state.slides = [dict(slide) for slide in SLIDES]
+    at.session_state.filename = "q3"
+    return at
+
+
+def test_generate_pdf_button_renders_through_queue(app, monkeypatch):
+    queue = FakeQueue()
+    monkeypatch.setattr(generate_carousel, "get_render_queue", lambda: queue)
+    app.run()
+    next(button for button in app.button if button.label == "📊 Generate PDF").click().run()
+    assert not app.exception
+    assert not [error.value for error in app.error]
+    assert any("PDF generated successfully" in success.value for success in app.success)
+    assert len(queue.submitted) == 1 and "Growth &amp; results" in queue.submitted[0]
+
+
+def test_regenerate_slide_button_replaces_only_that_slide(app, monkeypatch):
+    calls = []
+
+    def fake_regenerate(md_text, slides, index, instructions=None):
+        calls.append((index, instructions))
+        return {"type": "list", "title": "Wins, rewritten", "items": ["3 new clients"]}
+
+    monkeypatch.setattr(generate_carousel, "regenerate_slide", fake_regenerate)
+    app.session_state.source_markdown = "# Q3 Report\n\n## Wins\n- 3 new clients\n"
+    app.run()
+    app.selectbox[0].select(1).run()
+    app.text_input(key="regen_instructions_1").input("shorter").run()
+    app.button(key="regen_1").click().run()
+    assert not app.exception
+    assert not [error.value for error in app.error]
+    assert calls == [(1, "shorter")]
+    assert app.session_state.slides[0]["title"] == "Q3 Report"
+    assert app.session_state.slides[1]["title"] == "Wins, rewritten"
+
+
+def test_similar_report_is_looked_up_once_and_reused(app, monkeypatch):
+    lookups = []
+    match = {"key": "k", "similarity": 0.97, "markdown": "# Q3 Report\n", "slides": SLIDES, "stale_slides": [1]}
+
+    def fake_find(md_text):
+        lookups.append(md_text)
+        return match
+
+    monkeypatch.setattr(generate_carousel, "find_similar_generation", fake_find)
+    monkeypatch.setattr(generate_carousel, "reuse_similar_generation", lambda md_text, similar, refresh=False, on_slide=None: [dict(slide) for slide in similar["slides"]])
+    del app.session_state["slides"]
+    app.run()
+    app.radio[0].set_value("Paste Content Directly").run()
+    app.text_area[0].input("# Q3 Report\n\nRevenue grew 40%.\n").run()
+    app.run()
+    next(button for button in app.button if button.label == "♻️ Use Previous Slides").click().run()
+    assert not app.exception
+    assert not [error.value for error in app.error]
+    assert any("Reused 2 slides" in success.value for success in app.success)
+    assert len(lookups) == 1
+
+
+def test_reuploading_edited_file_of_same_size_uses_new_content(app):
+    del app.session_state["slides"]
+    app.run()
+    app.get("file_uploader")[0].upload("report.md", b"# Results 2024\n\nRevenue grew 40%.\n", "text/markdown").run()
+    assert "2024" in app.session_state.upload["content"]
+    app.get("file_uploader")[0].upload("report.md", b"# Results 2025\n\nRevenue grew 40%.\n", "text/markdown").run()
+    assert not app.exception
+    assert "2025" in app.session_state.upload["content"]